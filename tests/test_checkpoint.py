@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from too_many_repos.checkpoint import Checkpoint
+from too_many_repos.repo import FetchResult
+from too_many_repos.tmrconfig import config
+from too_many_repos.tmrignore import Ignorable, tmrignore
+
+
+def test_checkpoint_survives_truncated_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    checkpoint = Checkpoint(Path("/fleet"), 1)
+    checkpoint.open(append=False)
+    checkpoint.record_discovered([Path("/fleet/a"), Path("/fleet/b")])
+    checkpoint.record_fetched(Path("/fleet/a"), FetchResult(0.5, None))
+    checkpoint.close(completed=False)
+    with checkpoint.file.open("ab") as journal:
+        journal.write(b"\x80\x04\x95")  # killed mid-write
+
+    resumed = Checkpoint(Path("/fleet"), 1)
+    resumed.load()
+    assert resumed.discovered == [Path("/fleet/a"), Path("/fleet/b")]
+    assert resumed.fetched == {Path("/fleet/a"): FetchResult(0.5, None)}
+
+    other_depth = Checkpoint(Path("/fleet"), 2)
+    other_depth.load()
+    assert other_depth.discovered is None
+
+
+def test_checkpoint_of_other_discovery_filters_is_not_resumed(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(config, "gitdir_size_limit_mb", 100)
+    monkeypatch.setattr(tmrignore, "exclusions", set())
+    checkpoint = Checkpoint(Path("/fleet"), 1)
+    checkpoint.open(append=False)
+    checkpoint.record_discovered([Path("/fleet/a")])
+    checkpoint.close(completed=False)
+
+    monkeypatch.setattr(tmrignore, "exclusions", {Ignorable("/fleet/a/vendor")})
+    other_excludes = Checkpoint(Path("/fleet"), 1)
+    other_excludes.load()
+    assert other_excludes.discovered is None
+
+    monkeypatch.setattr(tmrignore, "exclusions", set())
+    monkeypatch.setattr(config, "gitdir_size_limit_mb", 200)
+    other_size_limit = Checkpoint(Path("/fleet"), 1)
+    other_size_limit.load()
+    assert other_size_limit.discovered is None
+
+
+def test_completed_run_leaves_nothing_to_resume(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    checkpoint = Checkpoint(Path("/fleet"), 1)
+    checkpoint.open(append=False)
+    checkpoint.record_discovered([Path("/fleet/a")])
+    checkpoint.close(completed=True)
+
+    resumed = Checkpoint(Path("/fleet"), 1)
+    resumed.load()
+    assert resumed.discovered is None
@@ -0,0 +1,30 @@
+import io
+
+from too_many_repos import compare
+
+
+def test_is_same_ignores_trailing_space_cr_and_blank_lines():
+    content = b"\x89PNG\r\n\nline two  \n"
+    assert compare.is_same(content, io.BytesIO(b"\x89PNG\n\n\nline two\r\n\n"))
+    assert not compare.is_same(content, io.BytesIO(b"\x89PNG\nline 2\n"))
+    assert not compare.is_same(content, io.BytesIO(b"\x89PNG\nline two\nmore\n"))
+    assert not compare.is_same(content, io.BytesIO(b"\x89PNG\n"))
+
+
+def test_is_same_mapped_reads_long_lines_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(compare, "CHUNK_SIZE", 4)
+    content = b"first\n\nsecond line\n"
+    file = tmp_path / "big.log"
+    file.write_bytes(b"first \r\n\n\nsecond line" + b" " * 50 + b"\n\n")
+    assert compare.is_same_mapped(content, file)
+    file.write_bytes(b"first\nsecond line" + b" " * 50 + b"x\n")
+    assert not compare.is_same_mapped(content, file)
+    file.write_bytes(b"first\nsecond line\nthird\n")
+    assert not compare.is_same_mapped(content, file)
+    file.write_bytes(b"x" * 100)
+    assert not compare.is_same_mapped(content, file)
+
+
+def test_min_size():
+    assert compare.min_size(["ab", "c", "ab"]) == len("ab\nc")
+    assert compare.min_size([]) == 0
@@ -0,0 +1,34 @@
+import subprocess as sp
+import time
+
+import pytest
+
+from too_many_repos import system
+from too_many_repos.deadline import Deadline, by_value
+
+from tests.test_repo import make_repo
+
+
+def test_deadline():
+    deadline = Deadline()
+    assert not deadline.expired()
+    assert deadline.timeout() is None
+    deadline.set(0)
+    assert deadline.expired()
+    assert 0 < deadline.timeout() <= 5
+
+
+def test_timeout_kills_spawned_processes():
+    started_at = time.monotonic()
+    with pytest.raises(sp.TimeoutExpired):
+        # The shell's child keeps the pipe open unless it's killed too
+        system.run_with_returncode("sh -c 'sleep 30; :'", timeout=0.2)
+    assert time.monotonic() - started_at < 5
+
+
+def test_by_value(tmp_path):
+    stale = make_repo(tmp_path / "stale")
+    active = make_repo(tmp_path / "active")
+    sp.run(["touch", "-d", "2000-01-01", str(stale.gitdir / "index")], check=True)
+    sp.run(["touch", "-d", "2000-01-01", str(stale.gitdir / "logs/HEAD")], check=True)
+    assert by_value([stale, active]) == [active, stale]
@@ -0,0 +1,22 @@
+import os
+
+from too_many_repos import difftool_store
+from too_many_repos.tmrconfig import config
+
+
+def test_content_is_written_once_and_unused_entries_are_collected(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    path = difftool_store.materialize("a.sh", "echo hi\n", "sha1")
+    assert path.read_text() == "echo hi\n"
+    path.write_text("echo HI\n")  # saved from the difftool
+    assert difftool_store.materialize("a.sh", "echo hi\n", "sha1") == path
+    assert path.read_text() == "echo hi\n"
+
+    old = difftool_store.materialize("b.sh", "echo old\n", "sha2")
+    long_ago = 1_000_000
+    os.utime(old.parent, (long_ago, long_ago))
+    difftool_store.collect_garbage()
+    assert not old.parent.exists()
+    assert path.is_file()
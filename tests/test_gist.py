@@ -0,0 +1,285 @@
+import os
+import pickle
+from concurrent import futures as fut
+
+import pytest
+
+from too_many_repos import equivalence, gist, github_api
+from too_many_repos.blobshas import BlobShaCache
+from too_many_repos.cache import Cache, GistFileContent, cache
+from too_many_repos.gitobjects import blob_sha
+from too_many_repos.tmrconfig import config
+
+
+def make_gist(date: str) -> gist.Gist:
+    return gist.Gist("abc", "my gist", "1 file", "secret", date)
+
+
+def test_cache_is_used_until_gist_is_updated(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(config.cache, "mode", "")
+    monkeypatch.setattr(config, "gist_backend", "api")
+    monkeypatch.setattr(Cache, "__cache__", {})
+    fetches = []
+
+    def fetch_files(self):
+        fetches.append(self.date)
+        return {"a.sh": GistFileContent(f"echo {self.date}", None)}
+
+    monkeypatch.setattr(gist.Gist, "_fetch_files", fetch_files)
+
+    assert make_gist("2024-12-06")._get_file_content("a.sh").content == (
+        "echo 2024-12-06"
+    )
+    monkeypatch.setattr(Cache, "__cache__", {})  # as in a new run
+    assert make_gist("2024-12-06")._get_file_names() == ["a.sh"]
+    assert make_gist("2024-12-06")._get_file_content("a.sh").content == (
+        "echo 2024-12-06"
+    )
+    assert fetches == ["2024-12-06"]
+
+    assert make_gist("2024-12-07")._get_file_content("a.sh").content == (
+        "echo 2024-12-07"
+    )
+    assert fetches == ["2024-12-06", "2024-12-07"]
+
+    # Written before entries were stamped
+    with (tmp_path / "gist_abc_filenames.pickle").open("wb") as file:
+        pickle.dump(["b.sh"], file)
+    monkeypatch.setattr(Cache, "__cache__", {})
+    assert make_gist("2024-12-07")._get_file_names() == ["a.sh"]
+
+
+def test_pipeline_fetches_local_matches_once_and_diffs_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())
+    monkeypatch.setattr(
+        gist,
+        "iter_gist_list",
+        lambda: iter(
+            [
+                "settings\tEditor settings\t4 files\tsecret\t2024-12-06",
+                "broken\tBroken\t1 file\tsecret\t2024-12-06",
+                "dup\tAnother c.json\t1 file\tsecret\t2024-12-06",
+            ]
+        ),
+    )
+    names = {
+        "settings": ["a.json", "b.json", "c.json", "e.json"],
+        "broken": ["d.sh"],
+        "dup": ["c.json"],
+    }
+    monkeypatch.setattr(gist.Gist, "_get_file_names", lambda self: names[self.id])
+    fetched = []
+
+    def get_file_content(self, file_name):
+        if self.id == "broken":
+            raise RuntimeError("HTTP 502")
+        fetched.append((self.id, file_name))
+        return GistFileContent(f"{file_name} content\n", None)
+
+    monkeypatch.setattr(gist.Gist, "_get_file_content", get_file_content)
+    (tmp_path / "project").mkdir()
+    (tmp_path / "project" / "a.json").write_text("a.json content\n")
+    (tmp_path / "b.json").write_text("something else\n")
+    (tmp_path / "c.json").write_text("c.json content\n")
+    (tmp_path / "d.sh").write_text("d.sh content\n")
+
+    with fut.ThreadPoolExecutor(4) as executor:
+        file_name_to_gist_files, need_user_disambiguation = gist.GistPipeline(
+            executor
+        ).run(tmp_path, max_depth=2)
+
+    assert sorted(fetched) == [
+        ("dup", "c.json"),
+        ("settings", "a.json"),
+        ("settings", "b.json"),
+        ("settings", "c.json"),
+    ]
+    assert not file_name_to_gist_files["d.sh"]
+    [e_json] = file_name_to_gist_files["e.json"]
+    assert not e_json.content and not e_json.diffs
+    [a_json] = file_name_to_gist_files["a.json"]
+    assert a_json.diffs == {tmp_path / "project" / "a.json": False}
+    [b_json] = file_name_to_gist_files["b.json"]
+    assert b_json.diffs == {tmp_path / "b.json": "content"}
+    assert list(need_user_disambiguation) == [tmp_path / "c.json"]
+    assert all(not gist_file.diffs for gist_file in file_name_to_gist_files["c.json"])
+
+
+def test_pipeline_survives_a_failed_listing(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())
+    monkeypatch.setattr(config, "gist_backend", "api")
+    monkeypatch.setattr(github_api, "_client", None)
+    monkeypatch.setattr(github_api, "get_token", lambda: None)
+    (tmp_path / "a.sh").write_text("echo hi\n")
+
+    with fut.ThreadPoolExecutor(4) as executor:
+        file_name_to_gist_files, need_user_disambiguation = gist.GistPipeline(
+            executor
+        ).run(tmp_path, max_depth=1)
+
+    assert not file_name_to_gist_files and not need_user_disambiguation
+
+
+def test_gist_list_is_synced_incrementally(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(config.cache, "mode", "")
+    monkeypatch.setattr(Cache, "__cache__", {})
+    listed = {
+        None: ["b\tB\t1 file\tsecret\t2024-12-07", "a\tA\t1 file\tsecret\t2024-12-06"],
+        "2024-12-07": ["a\tA v2\t2 files\tsecret\t2024-12-08"],
+        "2024-12-08": [],
+    }
+    sinces = []
+
+    def list_gists(since):
+        sinces.append(since)
+        return iter(listed[since])
+
+    monkeypatch.setattr(gist, "_list_gists", list_gists)
+
+    assert list(gist.iter_gist_list()) == listed[None]
+    monkeypatch.setattr(Cache, "__cache__", {})  # as in a new run
+    assert list(gist.iter_gist_list()) == [
+        "a\tA v2\t2 files\tsecret\t2024-12-08",
+        "b\tB\t1 file\tsecret\t2024-12-07",
+    ]
+    assert list(gist.iter_gist_list()) == [
+        "a\tA v2\t2 files\tsecret\t2024-12-08",
+        "b\tB\t1 file\tsecret\t2024-12-07",
+    ]
+    assert sinces == [None, "2024-12-07", "2024-12-08"]
+
+
+def test_deleted_gists_are_dropped_by_a_full_sync(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(config.cache, "mode", "")
+    monkeypatch.setattr(Cache, "__cache__", {})
+    listed = {
+        None: ["b\tB\t1 file\tsecret\t2024-12-07", "a\tA\t1 file\tsecret\t2024-12-06"],
+        "2024-12-07": [],
+    }
+    monkeypatch.setattr(gist, "_list_gists", lambda since: iter(listed[since]))
+    now = 1_000_000.0
+    monkeypatch.setattr(gist.time, "time", lambda: now)
+
+    assert len(list(gist.iter_gist_list())) == 2
+    listed[None] = ["a\tA\t1 file\tsecret\t2024-12-06"]  # b was deleted
+    now += gist.FULL_SYNC_MAX_AGE_SECONDS - 1
+    assert len(list(gist.iter_gist_list())) == 2
+    now += 1
+    assert list(gist.iter_gist_list()) == listed[None]
+    assert list(cache.gist_index.lines) == ["a"]
+    assert cache.gist_index.fully_synced_at == now
+
+
+def test_identical_file_is_confirmed_by_blob_sha(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(config.cache, "mode", "")
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())
+    gist_file = gist.GistFile("a.sh", make_gist("2024-12-06"))
+    gist_file.set_content("echo hi\n")
+    local = tmp_path / "a.sh"
+    local.write_text("echo hi\n")
+    os.utime(local, (1_700_000_000, 1_700_000_000))
+    gist_file.diff(local)
+    gist.blob_shas.save()
+
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())  # as in a new run
+    monkeypatch.setattr(
+        type(local), "read_bytes", lambda self: pytest.fail("read unchanged file")
+    )
+    gist_file.diffs.clear()
+    gist_file.diff(local)
+    assert gist_file.diffs == {local: False}
+
+
+def test_blob_sha_of_git_backend_holds_for_non_utf8_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())
+    data = b"caf\xe9\n"  # latin-1
+    gist_file = gist.GistFile("a.txt", make_gist("2024-12-06"))
+    gist_file.set_content(data.decode(errors="replace"), blob_sha(data))
+    local = tmp_path / "a.txt"
+    local.write_bytes(data)
+    gist_file.diff(local)
+    assert gist_file.diffs == {local: False}
+
+
+def test_recently_modified_file_blob_sha_is_not_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(config.cache, "mode", "")
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())
+    gist_file = gist.GistFile("a.sh", make_gist("2024-12-06"))
+    gist_file.set_content("echo hi\n")
+    local = tmp_path / "a.sh"
+    local.write_text("echo hi\n")
+    stat = local.stat()
+    gist_file.diff(local)
+    assert gist_file.diffs == {local: False}
+
+    # Rewritten within the same mtime tick, at the same size
+    local.write_text("echo HI\n")
+    os.utime(local, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    gist_file.diff(local)
+    assert gist_file.diffs == {local: "content"}
+
+
+def test_diff_text_with_default_rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())
+    gist_file = gist.GistFile("aliases", make_gist("2024-12-06"))
+    gist_file.set_content("alias a=b\nalias c=d\n")
+    local = tmp_path / "aliases"
+    for local_content, difference in [
+        ("alias a=b\nalias c=d\n", False),
+        ("alias c=d\nalias a=b\n", "order"),
+        ("alias a=b\n", "content"),
+    ]:
+        local.write_text(local_content)
+        gist_file.diff(local)
+        assert gist_file.diffs[local] == difference, local_content
+
+    local.write_text("alias a=b  \n\nalias c=d\n")
+    gist_file.diff(local)
+    assert gist_file.diffs[local] == "whitespace"
+
+    gist_file.set_content("if x:\n  y\n  z\n")
+    local.write_text("if x:\n  z\n  y\n")
+    gist_file.diff(local)
+    assert gist_file.diffs[local] == "content"
+
+
+def test_configured_gist_rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path)
+    monkeypatch.setattr(gist, "blob_shas", BlobShaCache())
+    monkeypatch.setattr(
+        config, "gist_rules", [equivalence.COMMENTS, equivalence.SUBSET]
+    )
+    gist_file = gist.GistFile(".bashrc", make_gist("2024-12-06"))
+    gist_file.set_content("# aliases\nalias a=b\nalias c=d\n")
+    local = tmp_path / ".bashrc"
+    for local_content, difference in [
+        ("alias a=b\n# changed comment\nalias c=d\n", "comments(# //)"),
+        ("alias c=d\n", "subset"),
+        ("alias  c=d\n", "content"),
+        ("", "subset"),
+    ]:
+        local.write_text(local_content)
+        gist_file.diff(local)
+        assert gist_file.diffs[local] == difference, local_content
+
+
+def test_rules_with_the_same_kind_keep_their_own_fingerprints(monkeypatch):
+    monkeypatch.setattr(
+        config,
+        "gist_rules",
+        [equivalence.ignoring_comments("#"), equivalence.ignoring_comments("//")],
+    )
+    gist_fingerprints = equivalence.fingerprints(["// c", "# note", "x=1"])
+    assert (
+        equivalence.match(gist_fingerprints, ["// c", "# other", "x=1"])
+        == "comments(#)"
+    )
@@ -0,0 +1,41 @@
+import subprocess as sp
+
+from too_many_repos import gist_mirror
+from too_many_repos.gitobjects import blob_sha
+from too_many_repos.tmrconfig import config
+
+GIT = ["-c", "user.email=t@t", "-c", "user.name=t"]
+
+
+def test_sync_and_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "path", tmp_path / "cache")
+    origin = tmp_path / "origin"
+    origin.mkdir()
+    sp.run(["git", "init", "-q", str(origin)], check=True)
+    (origin / "a.sh").write_text("echo a\n")
+    (origin / "b b.txt").write_bytes(b"no trailing newline")
+    (origin / "c.txt").write_bytes(b"caf\xe9\n")
+    sp.run(["git", "-C", str(origin), "add", "."], check=True)
+    sp.run(["git", "-C", str(origin), *GIT, "commit", "-qm", "1"], check=True)
+
+    mirror = gist_mirror.sync("abc", url=str(origin))
+    blobs = gist_mirror.list_blobs(mirror)
+    contents = gist_mirror.read_blobs(mirror, [sha for _, sha in blobs])
+    assert {name: contents[sha] for name, sha in blobs} == {
+        "a.sh": b"echo a\n",
+        "b b.txt": b"no trailing newline",
+        "c.txt": b"caf\xe9\n",
+    }
+    monkeypatch.setattr(gist_mirror, "GIST_URL", str(origin))
+    assert gist_mirror.get_gist_files("abc")["c.txt"] == (
+        "caf\ufffd\n",
+        blob_sha(b"caf\xe9\n"),
+    )
+
+    (origin / "a.sh").write_text("echo changed\n")
+    sp.run(["git", "-C", str(origin), *GIT, "commit", "-qam", "2"], check=True)
+    assert gist_mirror.sync("abc", url=str(origin)) == mirror
+    blobs = dict(gist_mirror.list_blobs(mirror))
+    assert gist_mirror.read_blobs(mirror, [blobs["a.sh"]]) == {
+        blobs["a.sh"]: b"echo changed\n"
+    }
@@ -0,0 +1,91 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from too_many_repos.github_api import GitHubClient, gist_list_line
+
+GISTS = [
+    {
+        "id": f"gist{i}",
+        "description": f"gist number {i}",
+        "public": i % 2 == 0,
+        "updated_at": "2024-12-06T00:00:00Z",
+        "files": {"a.sh": {}, "b.sh": {}},
+    }
+    for i in range(5)
+]
+
+
+class StandInGitHub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        headers = {}
+        if self.path.startswith("/gists?"):
+            page = int(parse_qs(urlsplit(self.path).query).get("page", ["1"])[0])
+            body = GISTS[(page - 1) * 2 : page * 2]
+            if page * 2 < len(GISTS):
+                next_url = f"http://127.0.0.1:{self.server.server_port}/gists?per_page=2&page={page + 1}"
+                headers["Link"] = f'<{next_url}>; rel="next"'
+        elif self.path.startswith("/gists/"):
+            gist_id = self.path.rpartition("/")[2]
+            raw_url = f"http://127.0.0.1:{self.server.server_port}/raw/{gist_id}"
+            body = {
+                "files": {
+                    "a.sh": {"content": f"echo {gist_id}\n", "truncated": False},
+                    "b.sh": {"content": "", "truncated": True, "raw_url": raw_url},
+                }
+            }
+        elif self.path.startswith("/raw/"):
+            body = None
+        else:
+            self.send_error(404)
+            return
+        data = b"big file\n" if body is None else json.dumps(body).encode()
+        self.send_response(200)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInGitHub)
+    StandInGitHub.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_lists_pages_and_reuses_connection(api_url):
+    client = GitHubClient(api_url, token="t")
+    gists = list(client.list_gists())
+    assert [gist["id"] for gist in gists] == [gist["id"] for gist in GISTS]
+    assert client.get_gist_files("gist3") == {
+        "a.sh": "echo gist3\n",
+        "b.sh": "big file\n",
+    }
+    # 3 list pages, a gist and a raw file over a single keep-alive connection
+    assert StandInGitHub.connections == 1
+    assert gist_list_line(gists[1]).split("\t") == [
+        "gist1",
+        "gist number 1",
+        "2 files",
+        "secret",
+        "2024-12-06T00:00:00Z",
+    ]
@@ -0,0 +1,30 @@
+import subprocess as sp
+
+from too_many_repos import maintenance
+from too_many_repos.cache import cache
+from too_many_repos.tmrconfig import config
+
+from tests.test_repo import make_repo
+
+
+def test_maintain_slow_repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.cache, "_path", tmp_path / "cache")
+    (tmp_path / "cache").mkdir()
+    monkeypatch.setattr(config, "maintenance_threshold", 1.0, raising=False)
+    repo = make_repo(tmp_path / "repo")
+    sp.run(["git", "-C", str(repo.path), "repack", "-dq"], check=True)
+    repo.fetch_duration = 0.5
+    repo.status_duration = 2.0
+    assert maintenance.lacks_multi_pack_index(repo)
+    assert maintenance.needs_maintenance(repo)
+
+    maintenance.maintain(repo)
+    assert maintenance.has_commit_graph(repo)
+    assert (repo.gitdir / "objects/pack/multi-pack-index").is_file()
+    assert not maintenance.lacks_multi_pack_index(repo)
+    assert not maintenance.needs_maintenance(repo)
+    assert cache.get_repo_maintenance(repo.path).status_duration == 2.0
+
+    repo.status_duration = 0.1
+    maintenance.report_speedups([repo])
+    assert cache.get_repo_maintenance(repo.path) is None
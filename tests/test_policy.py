@@ -0,0 +1,56 @@
+import subprocess as sp
+
+from too_many_repos import policy
+from too_many_repos.repo import Repo
+from too_many_repos.tmrconfig import config
+
+from tests.test_repo import make_repo
+
+GIT = ["-c", "user.email=t@t", "-c", "user.name=t"]
+
+
+def make_behind_clone(tmp_path) -> Repo:
+    make_repo(tmp_path / "origin")
+    sp.run(["git", "clone", "-q", str(tmp_path / "origin"), str(tmp_path / "clone")])
+    sp.run(
+        [
+            "git",
+            "-C",
+            str(tmp_path / "origin"),
+            *GIT,
+            "commit",
+            "-q",
+            "--allow-empty",
+            "-m",
+            "new",
+        ],
+        check=True,
+    )
+    sp.run(["git", "-C", str(tmp_path / "clone"), "fetch", "-q"], check=True)
+    repo = Repo(tmp_path / "clone")
+    repo.popuplate_status()
+    return repo
+
+
+def test_default_policy_pulls_clean_fast_forwards(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "policy_rules", None)
+    repo = make_behind_clone(tmp_path)
+    assert repo.is_behind
+    assert policy.decide(repo) == "pull"
+    assert policy.apply_policy([repo]) == []
+    repo.popuplate_status()
+    assert not repo.is_behind
+
+
+def test_policy_rules_order_and_fallback(tmp_path, monkeypatch):
+    repo = make_behind_clone(tmp_path)
+    (repo.path / "a.txt").write_text("modified\n")
+    repo.popuplate_status()
+    monkeypatch.setattr(config, "policy_rules", [policy.pull_clean_fast_forwards])
+    assert policy.decide(repo) == "ask"
+    monkeypatch.setattr(config, "policy_rules", [lambda repo: "skip"])
+    assert policy.apply_policy([repo]) == []
+    monkeypatch.setattr(config, "policy_rules", [lambda repo: 1 / 0])
+    assert policy.decide(repo) == "ask"
+    monkeypatch.setattr(config, "policy_rules", [lambda repo: "Pull"])
+    assert policy.apply_policy([repo]) == [repo]
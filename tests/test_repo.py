@@ -0,0 +1,194 @@
+import os
+import subprocess as sp
+import time
+from pathlib import Path
+
+from too_many_repos import gitindex
+from too_many_repos.repo import Branch, Repo, parse_branches, parse_status_counts
+
+
+def make_repo(path: Path) -> Repo:
+    sp.run(["git", "init", "-q", str(path)], check=True)
+    (path / "a.txt").write_text("a\n")
+    (path / "sub").mkdir()
+    (path / "sub" / "b.txt").write_text("b\n")
+    git = ["git", "-C", str(path), "-c", "user.email=t@t", "-c", "user.name=t"]
+    sp.run([*git, "add", "."], check=True)
+    sp.run([*git, "commit", "-qm", "init"], check=True)
+    return Repo(path)
+
+
+def test_status_fingerprint_is_stable(tmp_path):
+    repo = make_repo(tmp_path)
+    tracked_paths = repo._get_tracked_paths()
+    assert sorted(tracked_paths) == ["a.txt", "sub/b.txt"]
+    assert repo.status_fingerprint(tracked_paths) == repo.status_fingerprint(
+        tracked_paths
+    )
+
+
+def test_status_fingerprint_detects_in_place_edit(tmp_path):
+    repo = make_repo(tmp_path)
+    tracked_paths = repo._get_tracked_paths()
+    before = repo.status_fingerprint(tracked_paths)
+    with (tmp_path / "sub" / "b.txt").open("a") as file:
+        file.write("c\n")
+    assert repo.status_fingerprint(tracked_paths) != before
+
+
+def test_status_fingerprint_detects_untracked_file(tmp_path):
+    repo = make_repo(tmp_path)
+    tracked_paths = repo._get_tracked_paths()
+    before = repo.status_fingerprint(tracked_paths)
+    stat = os.stat(tmp_path / "sub")
+    (tmp_path / "sub" / "new.txt").write_text("new\n")
+    # Make sure the dir mtime moved even on coarse-timestamp filesystems
+    os.utime(tmp_path / "sub", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert repo.status_fingerprint(tracked_paths) != before
+
+
+def test_status_fingerprint_detects_ref_change(tmp_path):
+    repo = make_repo(tmp_path)
+    tracked_paths = repo._get_tracked_paths()
+    before = repo.status_fingerprint(tracked_paths)
+    git = ["git", "-C", str(tmp_path), "-c", "user.email=t@t", "-c", "user.name=t"]
+    sp.run([*git, "commit", "-q", "--allow-empty", "-m", "empty"], check=True)
+    assert repo.status_fingerprint(tracked_paths) != before
+
+
+def test_parse_branches():
+    output = "\n".join(
+        [
+            "master\0origin/master\0",
+            "feature\0origin/feature\0ahead 1, behind 2",
+            "old\0origin/old\0gone",
+            "local\0\0",
+            "behind-only\0origin/behind-only\0behind 3",
+        ]
+    )
+    assert parse_branches(output) == [
+        Branch("master", "origin/master", 0, 0, False),
+        Branch("feature", "origin/feature", 1, 2, False),
+        Branch("old", "origin/old", 0, 0, True),
+        Branch("local", "", 0, 0, False),
+        Branch("behind-only", "origin/behind-only", 0, 3, False),
+    ]
+
+
+def test_populate_branches(tmp_path):
+    repo = make_repo(tmp_path)
+    git = ["git", "-C", str(tmp_path), "-c", "user.email=t@t", "-c", "user.name=t"]
+    sp.run([*git, "branch", "--track", "follower", repo.remotes.current_branch])
+    sp.run([*git, "commit", "-q", "--allow-empty", "-m", "empty"], check=True)
+    repo.populate_branches()
+    assert Branch("follower", repo.remotes.current_branch, 0, 1, False) in repo.branches
+    assert [branch.name for branch in repo.stale_branches()] == ["follower"]
+
+
+def make_settled_repo(path: Path) -> Repo:
+    """A repo whose files aren't racily clean, and whose index stat data is fresh."""
+    repo = make_repo(path)
+    past = time.time_ns() - 10_000_000_000
+    for file in (path / "a.txt", path / "sub" / "b.txt"):
+        os.utime(file, ns=(past, past))
+    sp.run(["git", "-C", str(path), "status"], check=True, stdout=sp.DEVNULL)
+    return repo
+
+
+def test_read_index_versions(tmp_path):
+    repo = make_repo(tmp_path)
+    for version in (2, 4):
+        sp.run(
+            ["git", "-C", str(tmp_path), "update-index", f"--index-version={version}"],
+            check=True,
+        )
+        index = gitindex.read_index(repo.gitdir / "index")
+        assert index.version == version
+        assert [entry.path for entry in index.entries] == ["a.txt", "sub/b.txt"]
+        assert index.entries[0].size == 2
+
+    # Extended flags are what make git write version 3
+    sp.run(["git", "-C", str(tmp_path), "update-index", "--index-version=2"])
+    sp.run(["git", "-C", str(tmp_path), "update-index", "--skip-worktree", "a.txt"])
+    index = gitindex.read_index(repo.gitdir / "index")
+    assert index.version == 3
+    assert [entry.path for entry in index.entries] == ["a.txt", "sub/b.txt"]
+    assert index.entries[0].extended_flags & gitindex.EXTENDED_FLAG_SKIP_WORKTREE
+    assert not gitindex.is_worktree_stat_clean(tmp_path, index)
+
+
+def test_clean_status_without_git(tmp_path):
+    repo = make_settled_repo(tmp_path)
+    assert repo._get_clean_status() == "\n".join(
+        [
+            f"On branch {repo.remotes.current_branch}",
+            "nothing to commit, working tree clean",
+        ]
+    )
+    sp.run(["git", "-C", str(tmp_path), "gc", "-q"], check=True)
+    assert repo._get_clean_status() is not None, "commit object is packed"
+
+
+def test_clean_status_falls_back_to_git(tmp_path):
+    repo = make_settled_repo(tmp_path)
+    (tmp_path / ".gitignore").write_text("*.log\nbuild/\n")
+    sp.run(["git", "-C", str(tmp_path), "add", ".gitignore"], check=True)
+    assert repo._get_clean_status() is None, "staged change"
+
+    git = ["git", "-C", str(tmp_path), "-c", "user.email=t@t", "-c", "user.name=t"]
+    sp.run([*git, "commit", "-qm", "ignore"], check=True)
+    past = time.time_ns() - 10_000_000_000
+    os.utime(tmp_path / ".gitignore", ns=(past, past))
+    sp.run(["git", "-C", str(tmp_path), "status"], check=True, stdout=sp.DEVNULL)
+    assert repo._get_clean_status() is not None
+
+    (tmp_path / "sub" / "debug.log").write_text("ignored\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out").write_text("ignored\n")
+    assert repo._get_clean_status() is not None, "only ignored files were added"
+
+    (tmp_path / "sub" / "new.txt").write_text("untracked\n")
+    assert repo._get_clean_status() is None, "untracked file"
+    (tmp_path / "sub" / "new.txt").unlink()
+
+    os.utime(tmp_path / "a.txt")
+    assert repo._get_clean_status() is None, "stat data differs"
+
+
+def test_get_prompt_data(tmp_path):
+    repo = make_repo(tmp_path)
+    (tmp_path / "a.txt").write_text("modified\n")
+    repo.popuplate_status()
+    prompt_data = repo.get_prompt_data(color=False)
+    assert "modified:   a.txt" in prompt_data.status
+    assert "a.txt | 2 +-" in prompt_data.diffstat
+    assert prompt_data.incoming_log == ""
+
+
+def test_parse_status_counts():
+    status = """On branch master
+Your branch and 'origin/master' have diverged,
+and have 2 and 3 different commits each, respectively.
+
+Changes to be committed:
+  (use "git restore --staged <file>..." to unstage)
+	new file:   b.txt
+
+Changes not staged for commit:
+  (use "git add <file>..." to update what will be committed)
+	modified:   a.txt
+	deleted:    c.txt
+
+Untracked files:
+  (use "git add <file>..." to include in what will be committed)
+	d.txt
+"""
+    assert parse_status_counts(status) == {
+        "staged": 1,
+        "unstaged": 2,
+        "untracked": 1,
+        "conflicted": 0,
+    }
+    repo = Repo(Path("."))
+    repo.status = status
+    assert repo.ahead_behind() == (2, 3)
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from too_many_repos.cache import cache
+from too_many_repos.gitobjects import blob_sha
+from too_many_repos.repo import RACY_WINDOW_NS
+from too_many_repos.tmrconfig import config
+
+StatKey = Tuple[int, int, int, int]
+"""(st_dev, st_ino, st_size, st_mtime_ns)"""
+
+MAX_ENTRIES = 100_000
+"""Least recently used entries beyond this are dropped when saving"""
+
+
+def stat_key(stat: os.stat_result) -> StatKey:
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class BlobShaCache:
+    """
+    Git blob shas of local files, by their stat, kept across runs.
+    A file whose stat didn't change since it was hashed isn't read again.
+
+    Keyed by stat alone, it's safe to read in any cache mode but 'w', like the stamped
+    gist entries; it's always written.
+    """
+
+    def __init__(self):
+        self._shas: Optional[Dict[StatKey, str]] = None
+        self._lock = threading.Lock()
+        self._is_dirty = False
+
+    def _loaded(self) -> Dict[StatKey, str]:
+        if self._shas is None:
+            shas = cache.get_local_blob_shas() if config.cache.mode != "w" else None
+            self._shas = shas or {}
+        return self._shas
+
+    def get(self, stat: os.stat_result) -> Optional[str]:
+        """Thread-safe."""
+        key = stat_key(stat)
+        with self._lock:
+            shas = self._loaded()
+            if (sha := shas.pop(key, None)) is not None:
+                shas[key] = sha  # most recently used last
+            return sha
+
+    def add(self, stat: os.stat_result, data: bytes) -> str:
+        """Hashes `data`, which was read from the file after it was `stat`ed.
+        The sha isn't kept if the file was modified within RACY_WINDOW_NS of hashing,
+        as it could be modified again without its stat changing.
+        Thread-safe."""
+        hashed_at_ns = time.time_ns()
+        sha = blob_sha(data)
+        if stat.st_mtime_ns >= hashed_at_ns - RACY_WINDOW_NS:
+            return sha
+        with self._lock:
+            self._loaded()[stat_key(stat)] = sha
+            self._is_dirty = True
+        return sha
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._is_dirty:
+                return
+            shas = self._loaded()
+            for key in list(shas)[: max(len(shas) - MAX_ENTRIES, 0)]:
+                del shas[key]
+            cache.set_local_blob_shas(shas)
+            self._is_dirty = False
+
+
+blob_shas = BlobShaCache()
@@ -1,10 +1,37 @@
+import hashlib
+import os
 import pickle
-from typing import Any, List, Optional
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from too_many_repos.log import logger
 from too_many_repos.singleton import Singleton
 from too_many_repos.tmrconfig import config
 
+StampedEntry = namedtuple("StampedEntry", ["updated_at", "value"])
+"""A gist's cached file names or file content, with the gist's updated date (Gist.date)
+at the time it was fetched."""
+
+
+GistFileContent = namedtuple("GistFileContent", ["content", "blob_sha"])
+"""A gist file's content, and its git blob sha if the backend has it (git), or None;
+see GistFile.set_content()."""
+
+
+GistIndex = namedtuple(
+    "GistIndex", ["synced_at", "lines", "fully_synced_at"], defaults=[None]
+)
+"""The gist list: each gist's `gh gist list` line by gist id, most recently updated
+first, the latest updated date among them (to list only newer gists next time), and
+the time.time() of the last full listing (which drops deleted gists)."""
+
+
+def _value_if_fresh(entry: Any, updated_at: str) -> Optional[Any]:
+    """Entries from before stamping, or of a gist that has since been updated, are stale."""
+    if isinstance(entry, StampedEntry) and entry.updated_at == updated_at:
+        return entry.value
+    return None
+
 
 def safe_load_pickle(file_name: str) -> Optional[Any]:
     """Loads config.cache.path / {file_name}.pickle, or None if doesn't exist"""
@@ -22,65 +49,146 @@ class Cache(Singleton):
     __cache__ = dict()
 
     @property
-    def gist_list(self) -> Optional[List[str]]:
-        if gist_list := self.__cache__.get("gist_list"):
-            return gist_list
-        gist_list = safe_load_pickle("gist_list")
+    def gist_index(self) -> Optional[GistIndex]:
+        if gist_index := self.__cache__.get("gist_index"):
+            return gist_index
+        gist_index = safe_load_pickle("gist_index")
         logger.debug(
-            f'Cache | Loaded gists list: {"None" if gist_list is None else "OK"}'
+            f'Cache | Loaded gist index: {"None" if gist_index is None else len(gist_index.lines)}'
         )
-        self.__cache__["gist_list"] = gist_list
-        return gist_list
+        self.__cache__["gist_index"] = gist_index
+        return gist_index
 
-    @gist_list.setter
-    def gist_list(self, gist_list: List[str]):
-        logger.debug("Cache | WRITING gists list to file")
-        with (config.cache.path / "gist_list.pickle").open(
+    @gist_index.setter
+    def gist_index(self, gist_index: GistIndex):
+        logger.debug("Cache | WRITING gist index to file")
+        self.__cache__["gist_index"] = gist_index
+        with (config.cache.path / "gist_index.pickle").open(
             mode="w+b"
-        ) as gist_list_cache:
-            pickle.dump(gist_list, gist_list_cache)
+        ) as gist_index_cache:
+            pickle.dump(gist_index, gist_index_cache)
 
     @classmethod
-    def get_gist_filenames(cls, gist_id: str) -> Optional[List[str]]:
-        if gist_filenames := cls.__cache__.get(f"gist_{gist_id}_filenames"):
-            return gist_filenames
-        gist_filenames = safe_load_pickle(f"gist_{gist_id}_filenames")
+    def get_gist_filenames(cls, gist_id: str, updated_at: str) -> Optional[List[str]]:
+        """None if not cached, or if cached before the gist was last updated."""
+        if (entry := cls.__cache__.get(f"gist_{gist_id}_filenames")) is None:
+            entry = safe_load_pickle(f"gist_{gist_id}_filenames")
+            cls.__cache__[f"gist_{gist_id}_filenames"] = entry
+        gist_filenames = _value_if_fresh(entry, updated_at)
         logger.debug(
             f'Cache | Loaded cached filenames of {gist_id[:8]}: {"None" if gist_filenames is None else "OK"}'
         )
-        cls.__cache__[f"gist_{gist_id}_filenames"] = gist_filenames
         return gist_filenames
 
     @classmethod
-    def set_gist_filenames(cls, gist_id: str, gist_filenames: List[str]):
+    def set_gist_filenames(
+        cls, gist_id: str, gist_filenames: List[str], *, updated_at: str
+    ):
         logger.debug(f"Cache | WRITING filenames of {gist_id[:8]} to file")
+        entry = StampedEntry(updated_at, gist_filenames)
+        cls.__cache__[f"gist_{gist_id}_filenames"] = entry
         with (config.cache.path / f"gist_{gist_id}_filenames.pickle").open(
             mode="w+b"
         ) as gist_filenames_cache:
-            pickle.dump(gist_filenames, gist_filenames_cache)
+            pickle.dump(entry, gist_filenames_cache)
 
     @classmethod
-    def get_gist_file_content(cls, gist_id: str, file_name: str) -> Optional[str]:
-        if gist_file_content := cls.__cache__.get(f"gist_{gist_id}_{file_name}"):
-            return gist_file_content
-        gist_file_content = safe_load_pickle(f"gist_{gist_id}_{file_name}")
+    def get_gist_file_content(
+        cls, gist_id: str, file_name: str, updated_at: str
+    ) -> Optional[GistFileContent]:
+        """None if not cached, or if cached before the gist was last updated (or
+        before blob shas were cached with contents)."""
+        if (entry := cls.__cache__.get(f"gist_{gist_id}_{file_name}")) is None:
+            entry = safe_load_pickle(f"gist_{gist_id}_{file_name}")
+            cls.__cache__[f"gist_{gist_id}_{file_name}"] = entry
+        gist_file_content = _value_if_fresh(entry, updated_at)
+        if not isinstance(gist_file_content, GistFileContent):
+            gist_file_content = None
         logger.debug(
             f'Cache | Loaded cached file contents of [b]{file_name}[/b] of {gist_id[:8]}: {"None" if gist_file_content is None else "OK"}'
         )
-        cls.__cache__[f"gist_{gist_id}_{file_name}"] = gist_file_content
         return gist_file_content
 
     @classmethod
     def set_gist_file_content(
-        cls, gist_id: str, file_name: str, gist_file_content: List[str]
+        cls,
+        gist_id: str,
+        file_name: str,
+        gist_file_content: GistFileContent,
+        *,
+        updated_at: str,
     ):
         logger.debug(
             f"Cache | WRITING file contents of [b]{file_name}[/b] of {gist_id[:8]} to file"
         )
+        entry = StampedEntry(updated_at, gist_file_content)
+        cls.__cache__[f"gist_{gist_id}_{file_name}"] = entry
         with (config.cache.path / f"gist_{gist_id}_{file_name}.pickle").open(
             mode="w+b"
         ) as gist_file_content_cache:
-            pickle.dump(gist_file_content, gist_file_content_cache)
+            pickle.dump(entry, gist_file_content_cache)
+
+    @staticmethod
+    def get_local_blob_shas() -> Optional[Dict[Tuple[int, int, int, int], str]]:
+        """Not kept in memory; see blobshas.BlobShaCache."""
+        local_blob_shas = safe_load_pickle("local_blob_shas")
+        logger.debug(
+            f'Cache | Loaded local blob shas: {"None" if local_blob_shas is None else len(local_blob_shas)}'
+        )
+        return local_blob_shas
+
+    @staticmethod
+    def set_local_blob_shas(local_blob_shas: Dict[Tuple[int, int, int, int], str]):
+        logger.debug("Cache | WRITING local blob shas to file")
+        with (config.cache.path / "local_blob_shas.pickle").open(
+            mode="w+b"
+        ) as local_blob_shas_cache:
+            pickle.dump(local_blob_shas, local_blob_shas_cache)
+
+    @staticmethod
+    def _repo_file_name(repo_path: os.PathLike, kind: str) -> str:
+        path_hash = hashlib.sha1(str(repo_path).encode()).hexdigest()[:16]
+        return f"repo_{path_hash}_{kind}"
+
+    @classmethod
+    def get_repo_status(cls, repo_path: os.PathLike) -> Optional[Any]:
+        """Not kept in memory; each repo's status is read once per run."""
+        repo_status = safe_load_pickle(cls._repo_file_name(repo_path, "status"))
+        logger.debug(
+            f'Cache | Loaded cached status of [b]{repo_path}[/b]: {"None" if repo_status is None else "OK"}'
+        )
+        return repo_status
+
+    @classmethod
+    def set_repo_status(cls, repo_path: os.PathLike, repo_status: Any):
+        logger.debug(f"Cache | WRITING status of [b]{repo_path}[/b] to file")
+        with (
+            config.cache.path / f"{cls._repo_file_name(repo_path, 'status')}.pickle"
+        ).open(mode="w+b") as repo_status_cache:
+            pickle.dump(repo_status, repo_status_cache)
+
+    @classmethod
+    def get_repo_maintenance(cls, repo_path: os.PathLike) -> Optional[Any]:
+        return safe_load_pickle(cls._repo_file_name(repo_path, "maintenance"))
+
+    @classmethod
+    def set_repo_maintenance(cls, repo_path: os.PathLike, repo_maintenance: Any):
+        logger.debug(
+            f"Cache | WRITING maintenance record of [b]{repo_path}[/b] to file"
+        )
+        with (
+            config.cache.path
+            / f"{cls._repo_file_name(repo_path, 'maintenance')}.pickle"
+        ).open(mode="w+b") as repo_maintenance_cache:
+            pickle.dump(repo_maintenance, repo_maintenance_cache)
+
+    @classmethod
+    def delete_repo_maintenance(cls, repo_path: os.PathLike):
+        logger.debug(f"Cache | DELETING maintenance record of [b]{repo_path}[/b]")
+        (
+            config.cache.path
+            / f"{cls._repo_file_name(repo_path, 'maintenance')}.pickle"
+        ).unlink(missing_ok=True)
 
 
 cache = Cache()
@@ -0,0 +1,104 @@
+import hashlib
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+
+from too_many_repos.log import logger
+from too_many_repos.repo import FetchResult
+from too_many_repos.tmrconfig import config
+from too_many_repos.tmrignore import tmrignore
+
+MAX_AGE_SECONDS = 60 * 60
+"""Checkpointed work older than this is done again on --resume"""
+
+
+def discovery_filters() -> List[str]:
+    """What besides the parent path and max depth decides which repos are discovered:
+    the excluded paths and patterns (-e and .tmrignore files), and the .git dir size
+    limit."""
+    return [
+        *sorted(str(ignorable) for ignorable in tmrignore),
+        *sorted(f"!{exclusion}" for exclusion in tmrignore.exclusions),
+        f"gitdir_size_limit_mb={config.gitdir_size_limit_mb}",
+    ]
+
+
+class Checkpoint:
+    """
+    A journal of per-repo stage completion (discovered, fetched) of a run over
+    `parent_path`, so an interrupted run can be resumed with --resume.
+
+    Records are appended and flushed as each repo finishes a stage, so nothing is lost
+    when the run is killed, and writing stays O(1) per repo. A truncated last record
+    (killed mid-write) is ignored when loading. The journal of a run that completed
+    is deleted.
+
+    Like `Cache`, doesn't care about the configured cache mode; the caller does.
+    """
+
+    def __init__(self, parent_path: Path, max_depth: int):
+        # A run with other discovery filters discovers other repos, so it doesn't
+        # resume this one's journal
+        key = hashlib.sha1(
+            "\0".join([str(parent_path), str(max_depth), *discovery_filters()]).encode()
+        ).hexdigest()[:16]
+        self.file = config.cache.path / f"checkpoint_{key}.pickle"
+        self.discovered: Optional[List[Path]] = None
+        self.fetched: Dict[Path, FetchResult] = {}
+        self._journal: Optional[IO[bytes]] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Reads the records that aren't older than MAX_AGE_SECONDS."""
+        try:
+            journal = self.file.open("rb")
+        except FileNotFoundError:
+            return
+        oldest = time.time() - MAX_AGE_SECONDS
+        with journal:
+            while True:
+                try:
+                    stage, recorded_at, *data = pickle.load(journal)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    break
+                if recorded_at < oldest:
+                    continue
+                if stage == "discovered":
+                    (self.discovered,) = data
+                elif stage == "fetched":
+                    path, fetch_result = data
+                    self.fetched[path] = fetch_result
+        logger.debug(
+            f"Checkpoint | Loaded {self.file.name}: "
+            f"{'no' if self.discovered is None else len(self.discovered)} discovered, "
+            f"{len(self.fetched)} fetched"
+        )
+
+    def open(self, *, append: bool) -> None:
+        """Starts recording. Unless `append`, previous records are discarded."""
+        self._journal = self.file.open("ab" if append else "wb")
+
+    def close(self, *, completed: bool) -> None:
+        """If the run `completed`, there's nothing to resume, so the journal is deleted
+        (a later --resume starts over rather than reusing stale fetches)."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            if completed:
+                self.file.unlink(missing_ok=True)
+
+    def _record(self, stage: str, *data) -> None:
+        """Thread-safe. Does nothing unless `open()` was called."""
+        if self._journal is None:
+            return
+        with self._lock:
+            self._journal.write(pickle.dumps((stage, time.time(), *data)))
+            self._journal.flush()
+
+    def record_discovered(self, paths: List[Path]) -> None:
+        self._record("discovered", paths)
+
+    def record_fetched(self, path: Path, fetch_result: FetchResult) -> None:
+        self._record("fetched", path, fetch_result)
@@ -0,0 +1,96 @@
+import hashlib
+import mmap
+from itertools import zip_longest
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List
+
+WHITESPACE = b" \t\r\n\f\v"
+CHUNK_SIZE = 1 << 20
+
+
+def normalized_lines(lines: Iterable[bytes]) -> Iterator[bytes]:
+    """Lines without trailing whitespace (including CR), skipping blank ones.
+    Skipping blank lines is looser than the `diff` this replaced, on purpose: it's what
+    GistFile's text comparison (the 'whitespace' rule) has always done, so binary and
+    large files are held to the same equivalence as text files."""
+    for line in lines:
+        if line := line.rstrip(WHITESPACE):
+            yield line
+
+
+def is_same(content: bytes, file: BinaryIO) -> bool:
+    """Whether `file` has the same normalized lines as `content`.
+    `file` is read line by line, and only until the first difference."""
+    return all(
+        line == other_line
+        for line, other_line in zip_longest(
+            normalized_lines(content.split(b"\n")), normalized_lines(file)
+        )
+    )
+
+
+def digest(lines: Iterable[str]) -> bytes:
+    """Equal for equal lists of lines (practically)."""
+    hasher = hashlib.sha1()
+    for line in lines:
+        hasher.update(line.encode(errors="surrogatepass"))
+        hasher.update(b"\n")
+    return hasher.digest()
+
+
+def min_size(lines: List[str]) -> int:
+    """
+    The smallest size in bytes of a file that could still be the same as `lines`
+    (normalized text lines) in some way: it has to have each distinct line at least
+    once, and a newline between each two.
+    """
+    distinct_lines = set(lines)
+    return sum(len(line.encode()) for line in distinct_lines) + max(
+        len(distinct_lines) - 1, 0
+    )
+
+
+def _mapped_lines(mapped: mmap.mmap, longest: int) -> Iterator[bytes]:
+    """
+    Like `normalized_lines()`, but of a memory-mapped file, and copying at most
+    `longest` + CHUNK_SIZE bytes at a time.
+    A line that's longer than `longest` when normalized can't match, and is yielded as
+    b"" (which no normalized line equals).
+    """
+    position, size = 0, len(mapped)
+    while position < size:
+        end = mapped.find(b"\n", position, position + longest + 1)
+        if end != -1:
+            if line := mapped[position:end].rstrip(WHITESPACE):
+                yield line
+            position = end + 1
+            continue
+        # No newline within `longest` bytes; the rest of the line must be whitespace
+        head = mapped[position : position + longest]
+        position += longest
+        while position < size:
+            end = mapped.find(b"\n", position, position + CHUNK_SIZE)
+            stop = min(position + CHUNK_SIZE, size) if end == -1 else end
+            if mapped[position:stop].strip(WHITESPACE):
+                yield b""
+                return
+            position = stop
+            if end != -1:
+                position += 1
+                break
+        if line := head.rstrip(WHITESPACE):
+            yield line
+
+
+def is_same_mapped(content: bytes, path: Path) -> bool:
+    """Like `is_same()`, but reads the file through mmap, so memory use doesn't grow
+    with its size, even if it has no newlines."""
+    lines = list(normalized_lines(content.split(b"\n")))
+    longest = max(map(len, lines), default=0)
+    with path.open("rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped:
+        return all(
+            line == other_line
+            for line, other_line in zip_longest(lines, _mapped_lines(mapped, longest))
+        )
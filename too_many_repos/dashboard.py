@@ -0,0 +1,145 @@
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rich.live import Live
+from rich.table import Table
+
+from too_many_repos.log import console
+
+STAGES = ("discovery", "fetch", "status", "gists")
+IN_FLIGHT_SHOWN = 3
+SLOWEST_SHOWN = 3
+REFRESH_PER_SECOND = 4
+
+
+class StageProgress:
+    def __init__(self, name: str):
+        self.name = name
+        self.queued = 0
+        self.done = 0
+        self.started_at: Optional[float] = None
+        self.last_done_at: Optional[float] = None
+        self.in_flight: Dict[str, float] = {}
+        # Min-heap of (duration, item), so the fastest of the slowest is popped
+        self.slowest: List[Tuple[float, str]] = []
+
+    def rate(self, now: float) -> float:
+        """Items per second since the first item started."""
+        if self.started_at is None or not self.done:
+            return 0.0
+        end = now if self.in_flight else self.last_done_at
+        return self.done / max(end - self.started_at, 1e-6)
+
+
+class Dashboard:
+    """
+    Tracks completed / queued / in-flight items of each stage (discovery, fetch, status,
+    gists), and while `live()` is active, renders them in a rich Live table.
+
+    Updates only touch counters under a lock; rendering happens in rich's refresh thread
+    at most REFRESH_PER_SECOND times, so it doesn't slow the stages down.
+    """
+
+    def __init__(self):
+        self.enabled = console.is_terminal
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageProgress] = {
+            name: StageProgress(name) for name in STAGES
+        }
+
+    def queue(self, stage: str, count: int = 1) -> None:
+        with self._lock:
+            self._stages[stage].queued += count
+
+    def start(self, stage: str, item: str) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            progress = self._stages[stage]
+            if progress.started_at is None:
+                progress.started_at = now
+            progress.in_flight[item] = now
+
+    def finish(self, stage: str, item: str) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            progress = self._stages[stage]
+            started_at = progress.in_flight.pop(item, now)
+            progress.done += 1
+            progress.last_done_at = now
+            entry = (now - started_at, item)
+            if len(progress.slowest) < SLOWEST_SHOWN:
+                heapq.heappush(progress.slowest, entry)
+            else:
+                heapq.heappushpop(progress.slowest, entry)
+
+    def advance(self, stage: str, count: int = 1) -> None:
+        """For stages whose items aren't known in advance, like discovery."""
+        now = time.perf_counter()
+        with self._lock:
+            progress = self._stages[stage]
+            if progress.started_at is None:
+                progress.started_at = now
+            progress.queued += count
+            progress.done += count
+            progress.last_done_at = now
+
+    @contextmanager
+    def track(self, stage: str, item: str) -> Iterator[None]:
+        self.start(stage, item)
+        try:
+            yield
+        finally:
+            self.finish(stage, item)
+
+    @contextmanager
+    def live(self) -> Iterator[None]:
+        """Renders the dashboard until exiting. Does nothing if stdout isn't a terminal
+        or the dashboard is disabled. Don't prompt while it's active."""
+        if not self.enabled:
+            yield
+            return
+        with Live(
+            get_renderable=self.render,
+            console=console,
+            refresh_per_second=REFRESH_PER_SECOND,
+            transient=True,
+        ):
+            yield
+        console.print(self.render())
+
+    def render(self) -> Table:
+        now = time.perf_counter()
+        table = Table(title="Progress", title_justify="left")
+        for column in ("Stage", "Done", "Per second", "In flight", "Slowest"):
+            table.add_column(column)
+        with self._lock:
+            for progress in self._stages.values():
+                if progress.started_at is None and not progress.queued:
+                    continue
+                in_flight = sorted(progress.in_flight.items(), key=lambda kv: kv[1])
+                in_flight_str = "\n".join(
+                    f"{item} ({now - started_at:.1f}s)"
+                    for item, started_at in in_flight[:IN_FLIGHT_SHOWN]
+                )
+                if len(in_flight) > IN_FLIGHT_SHOWN:
+                    in_flight_str += (
+                        f"\n[dim]+{len(in_flight) - IN_FLIGHT_SHOWN} more[/dim]"
+                    )
+                slowest_str = "\n".join(
+                    f"{item} ({duration:.1f}s)"
+                    for duration, item in sorted(progress.slowest, reverse=True)
+                )
+                table.add_row(
+                    progress.name,
+                    f"{progress.done}/{progress.queued}",
+                    f"{progress.rate(now):.1f}",
+                    in_flight_str,
+                    slowest_str,
+                )
+        return table
+
+
+dashboard = Dashboard()
@@ -0,0 +1,57 @@
+import os
+import time
+from typing import List, Optional
+
+from too_many_repos.repo import Repo
+
+GRACE_SECONDS = 5.0
+"""How long git processes that are running when the deadline passes may keep running,
+before they're killed."""
+
+
+class Deadline:
+    """
+    A time budget for the whole run, set by --deadline.
+    Once it has passed, no new fetch or status work should start; git processes that are
+    already running get GRACE_SECONDS to finish (see `timeout()`).
+    """
+
+    def __init__(self):
+        self.at: Optional[float] = None
+        """time.monotonic() value, or None if there's no deadline"""
+
+    def set(self, seconds: Optional[float]) -> None:
+        self.at = None if seconds is None else time.monotonic() + seconds
+
+    def expired(self) -> bool:
+        return self.at is not None and time.monotonic() >= self.at
+
+    def timeout(self) -> Optional[float]:
+        """For `subprocess.run(timeout=...)`: the time left plus the grace period,
+        or None if there's no deadline."""
+        if self.at is None:
+            return None
+        return max(self.at - time.monotonic(), 0) + GRACE_SECONDS
+
+
+def last_activity_ns(repo: Repo) -> int:
+    """The latest mtime of the files git touches when you work in a repo: the index
+    (staging, checkouts) and HEAD's reflog (commits, pulls, rebases)."""
+    latest = 0
+    for path in (repo.gitdir / "index", repo.gitdir / "logs/HEAD"):
+        try:
+            latest = max(latest, os.stat(path).st_mtime_ns)
+        except OSError:
+            pass
+    return latest
+
+
+def by_value(repos: List[Repo]) -> List[Repo]:
+    """
+    Repos in the order work should be scheduled under a deadline: the ones worked in most
+    recently first, as they're the likeliest to have something to act on.
+    """
+    return sorted(repos, key=last_activity_ns, reverse=True)
+
+
+deadline = Deadline()
@@ -0,0 +1,57 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+from too_many_repos.log import logger
+from too_many_repos.tmrconfig import config
+
+MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+"""Entries not used by a difftool for this long are deleted by collect_garbage()"""
+
+
+def store_path() -> Path:
+    return config.cache.path / "difftool"
+
+
+def materialize(file_name: str, content: str, sha: str) -> Path:
+    """
+    A file with `content`, named `file_name` so difftools recognize its type, to pass
+    to a difftool. Stored by content sha, so it's written once and reused by later
+    runs for as long as the content doesn't change.
+    Difftools can edit and save it, so it's checked before being reused, and written
+    again if it no longer has `content`.
+    """
+    entry = store_path() / sha
+    path = entry / file_name
+    data = content.encode()
+    if not _has_data(path, data):
+        config.verbose >= 2 and logger.debug(f"DifftoolStore | Writing {path}")
+        entry.mkdir(parents=True, exist_ok=True)
+        partial = entry / f".{file_name}.{os.getpid()}"
+        partial.write_bytes(data)
+        partial.replace(path)  # atomic, so a difftool never sees a partial file
+    os.utime(entry)  # used; see collect_garbage()
+    return path
+
+
+def _has_data(path: Path, data: bytes) -> bool:
+    """Only reads the file if its size matches."""
+    try:
+        return path.stat().st_size == len(data) and path.read_bytes() == data
+    except FileNotFoundError:
+        return False
+
+
+def collect_garbage() -> None:
+    """Deletes entries that no difftool used in the last MAX_AGE_SECONDS.
+    Entries of this run are kept, as difftools may still have them open."""
+    oldest = time.time() - MAX_AGE_SECONDS
+    try:
+        entries = list(store_path().iterdir())
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.stat().st_mtime < oldest:
+            config.verbose >= 2 and logger.debug(f"DifftoolStore | Deleting {entry}")
+            shutil.rmtree(entry, ignore_errors=True)
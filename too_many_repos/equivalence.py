@@ -0,0 +1,143 @@
+import hashlib
+import operator
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional
+
+from too_many_repos import compare
+from too_many_repos.log import logger
+from too_many_repos.tmrconfig import config
+
+
+@dataclass(frozen=True)
+class EquivalenceRule:
+    """
+    A way a local file can differ from a gist file and still be reported as the same
+    thing under another name, e.g. 'order'.
+    Both files are reduced to a fingerprint, which for the gist file is computed once
+    when its content is loaded.
+    """
+
+    name: str
+    fingerprint: Callable[[List[str]], Hashable]
+    """Of a file's lines."""
+    matches: Callable[[Hashable, Hashable], bool] = operator.eq
+    """Gets the gist file's fingerprint, then the local file's."""
+    min_size: Callable[[List[str]], int] = lambda lines: 0
+    """Of a local file that could match, by the gist file's lines."""
+
+
+def rstripped(lines: List[str]) -> List[str]:
+    """Non-empty lines without trailing whitespace."""
+    return list(filter(bool, map(str.rstrip, lines)))
+
+
+def is_flat_format(lines: List[str]) -> bool:
+    return all(line == line.lstrip() for line in filter(bool, lines))
+
+
+def multiset_hash(lines: List[str]) -> int:
+    """Equal for lines that are the same up to order (practically).
+    The sum of 64-bit line hashes, so duplicate lines count."""
+    total = 0
+    for line in lines:
+        line_hash = hashlib.blake2b(line.encode(errors="surrogatepass"), digest_size=8)
+        total += int.from_bytes(line_hash.digest(), "big")
+    return total % (1 << 64)
+
+
+def _order_fingerprint(lines: List[str]) -> Optional[int]:
+    # Reordering indented lines (e.g. code) is rarely harmless
+    if not is_flat_format(lines):
+        return None
+    return multiset_hash(rstripped(lines))
+
+
+def _rstripped_min_size(lines: List[str]) -> int:
+    return compare.min_size(rstripped(lines))
+
+
+WHITESPACE = EquivalenceRule(
+    "whitespace",
+    lambda lines: compare.digest(rstripped(lines)),
+    min_size=_rstripped_min_size,
+)
+"""Same but for trailing whitespace and blank lines."""
+
+ORDER = EquivalenceRule(
+    "order",
+    _order_fingerprint,
+    matches=lambda fingerprint, other: fingerprint is not None and fingerprint == other,
+    min_size=_rstripped_min_size,
+)
+"""Same lines in another order, for flat files (no indented lines), like lists of
+aliases or settings."""
+
+SUBSET = EquivalenceRule(
+    "subset",
+    lambda lines: frozenset(rstripped(lines)),
+    matches=lambda line_set, other_line_set: other_line_set <= line_set,
+)
+"""Every line of the local file is in the gist file, e.g. a partial copy."""
+
+
+def ignoring_comments(*prefixes: str) -> EquivalenceRule:
+    """Same but for whole-line comments starting with any of `prefixes`, and trailing
+    whitespace and blank lines."""
+
+    def fingerprint(lines: List[str]) -> bytes:
+        return compare.digest(
+            line for line in rstripped(lines) if not line.lstrip().startswith(prefixes)
+        )
+
+    return EquivalenceRule(f"comments({' '.join(prefixes)})", fingerprint)
+
+
+COMMENTS = ignoring_comments("#", "//")
+
+DEFAULT_RULES: List[EquivalenceRule] = [WHITESPACE, ORDER]
+
+
+def rules() -> List[EquivalenceRule]:
+    """`config.gist_rules`, or DEFAULT_RULES if unset."""
+    return DEFAULT_RULES if config.gist_rules is None else config.gist_rules
+
+
+def fingerprints(lines: List[str]) -> Dict[int, Hashable]:
+    """Of a gist file's lines, by the rule's index in `rules()` (names needn't be
+    unique). A rule whose fingerprint fails is left out, and never matches."""
+    gist_fingerprints = {}
+    for i, rule in enumerate(rules()):
+        try:
+            gist_fingerprints[i] = rule.fingerprint(lines)
+        except Exception as e:
+            logger.warning(
+                f"Equivalence | rule {rule.name} had {e.__class__.__name__}: {e}; skipping"
+            )
+    return gist_fingerprints
+
+
+def min_size(lines: List[str]) -> int:
+    """Of a local file that could be the same as a gist file with `lines`, or match
+    any rule."""
+    return min(
+        [
+            compare.min_size(rstripped(lines)),
+            *(rule.min_size(lines) for rule in rules()),
+        ]
+    )
+
+
+def match(gist_fingerprints: Dict[int, Hashable], lines: List[str]) -> Optional[str]:
+    """The name of the first rule a local file with `lines` matches, or None.
+    The local file's fingerprint is only computed for the rules that are checked."""
+    for i, rule in enumerate(rules()):
+        if i not in gist_fingerprints:
+            continue
+        try:
+            if rule.matches(gist_fingerprints[i], rule.fingerprint(lines)):
+                return rule.name
+        except Exception as e:
+            logger.warning(
+                f"Equivalence | rule {rule.name} had {e.__class__.__name__}: {e}; skipping"
+            )
+    return None
@@ -1,35 +1,94 @@
+import http.client
+import threading
+import time
 import typing
 from collections import defaultdict
 from concurrent import futures as fut
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, ForwardRef, List, Literal
-
-from too_many_repos import system
-from too_many_repos.cache import cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    ForwardRef,
+    Hashable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from too_many_repos import (
+    compare,
+    difftool_store,
+    equivalence,
+    gist_mirror,
+    github_api,
+    system,
+)
+from too_many_repos.blobshas import blob_shas
+from too_many_repos.cache import GistFileContent, GistIndex, cache
+from too_many_repos.dashboard import dashboard
+from too_many_repos.gitobjects import blob_sha
 from too_many_repos.log import logger
 from too_many_repos.tmrconfig import config
 from too_many_repos.tmrignore import tmrignore
+from too_many_repos.util import safe_glob, safe_is_dir, safe_is_file
+
+Difference = Union[Literal["content", False], str]
+"""False if identical, the name of the first equivalence rule the files match
+(e.g. 'whitespace', 'order'; see equivalence.py), or 'content'."""
 
-Difference = Literal["whitespace", "content", "order", False]
+LARGE_FILE_SIZE = 4 << 20
+"""Local files larger than this are compared through mmap rather than read whole"""
+
+FULL_SYNC_MAX_AGE_SECONDS = 24 * 60 * 60
+"""The gist index is listed in full (rather than only gists updated since its last
+sync) if its last full listing is older than this, to notice deleted gists"""
 
 
 class GistFile:
     content: str
-    rstripped_content: str
+    digest: bytes
+    fingerprints: Dict[int, Hashable]
+    blob_sha: str
+    min_size: int
     diffs: Dict[Path, Difference]
     gist: ForwardRef("Gist")
     file_name: str
 
     def __init__(self, name: str, gist: ForwardRef("Gist")):
         self.content: str = ""
-        self.rstripped_content: str = ""
+        self.digest: bytes = b""
+        self.fingerprints = {}
+        self.blob_sha: str = ""
+        self.min_size: int = 0
         self.diffs = dict()
         self.file_name = name
         self.gist = gist
-        self.gist_temp_base_path = Path(f"/tmp/{self.gist.id}")
-        self.gist_temp_base_path.mkdir(exist_ok=True, parents=True)
-        self.gist_file_temp_path = self.gist_temp_base_path / self.file_name
+
+    def set_content(self, content: str, sha: Optional[str] = None) -> None:
+        """
+        Also computes everything about the content that diffing needs, once, rather
+        than per local file.
+        `sha` is the blob sha from the git backend, which holds for content that isn't
+        valid UTF-8 too; otherwise it's computed from `content`.
+        With the gh backend, content is stripped, so blob_sha won't match an
+        otherwise identical local file, which is then diffed line by line.
+        """
+        self.content = content
+        content_sha = blob_sha(content.encode())
+        self.blob_sha = sha or content_sha
+        lines = content.splitlines()
+        self.digest = compare.digest(lines)
+        self.fingerprints = equivalence.fingerprints(lines)
+        # Content decoded with replacement characters can't bound the size of a local
+        # file that's identical to the gist file
+        is_lossless = self.blob_sha == content_sha
+        self.min_size = equivalence.min_size(lines) if is_lossless else 0
 
     def __repr__(self) -> str:
         rv = f"GistFile('{self.file_name}') {{ \n\tcontent: "
@@ -45,17 +104,28 @@ class GistFile:
     def diff(self, against: Path) -> None:
         """
         Populates self.diffs[against] with the `Difference` between self and given file;
-        either 'whitespace', 'content', 'order', or False.
+        False, the name of a matching equivalence rule (e.g. 'whitespace'), or 'content'.
         """
-        # TODO (reuse files): write to ~/.cache/<SESSION>/ instead and check if exists before
         logger.debug(f'GistFile.diff() | {self.gist.short()} diffing "{against}"...')
 
-        try:
-            against_lines = against.open().read().splitlines()
-        except UnicodeDecodeError:
-            difference = self._diff_binary(against)
+        # Identical files are confirmed by blob sha, without reading them if their
+        # stat is unchanged since last hashed
+        stat = against.stat()
+        if blob_shas.get(stat) == self.blob_sha:
+            difference = False
+        elif stat.st_size < self.min_size:
+            difference = "content"
+        elif stat.st_size > LARGE_FILE_SIZE:
+            difference = self._diff_large(against, stat.st_size)
+        elif blob_shas.add(stat, data := against.read_bytes()) == self.blob_sha:
+            difference = False
         else:
-            difference = self._diff_text(against, against_lines)
+            try:
+                against_lines = data.decode().splitlines()
+            except UnicodeDecodeError:
+                difference = self._diff_binary(against)
+            else:
+                difference = self._diff_text(against, against_lines)
 
         if config.verbose >= 2:
             if difference:
@@ -67,59 +137,35 @@ class GistFile:
                 )
         self.diffs[against] = difference
 
-    def _is_flat_format(self) -> bool:
-        return all(
-            line == line.lstrip() for line in filter(bool, self.content.splitlines())
-        )
+    def difftool_path(self) -> Path:
+        """The content as a file for a difftool, written on first use."""
+        return difftool_store.materialize(self.file_name, self.content, self.blob_sha)
 
-    def _diff_binary(self, against: Path) -> Difference:
-        write_file(
-            self.gist_file_temp_path,
-            self.content,
-            overwrite_ok=False,
-        )
-        same_as_is = system.diff_quiet(f'"{self.gist_file_temp_path}" "{against}"')
-        return False if same_as_is else "content"
-
-    def _diff_text(self, against: Path, against_lines: list[str]) -> Difference:
-        against_lines_rstripped = list(filter(bool, map(str.rstrip, against_lines)))
-        same_when_rstripped: bool = (
-            against_lines_rstripped == self.rstripped_content.splitlines()
-        )
-        if not same_when_rstripped:
+    def _diff_large(self, against: Path, size: int) -> Difference:
+        """Reads at most up to the first difference, through mmap.
+        Only the 'whitespace' rule is checked; others would need the whole file's
+        lines."""
+        content = self.content.encode()
+        if not compare.is_same_mapped(content, against):
             difference = "content"
-        elif not (
-            against_lines == self.content.splitlines()
-            # elif not same as-is:
-        ):
+        elif size == len(content) and against.read_bytes() == content:
+            difference = False
+        elif equivalence.WHITESPACE in equivalence.rules():
             difference = "whitespace"
         else:
-            difference = False
-        if difference and self._is_flat_format():
-            against_set = set(filter(bool, against_lines_rstripped))
-            self_set = set(filter(bool, self.rstripped_content.splitlines()))
-            if against_set == self_set:
-                difference = "order"
-        if difference:
-            write_file(
-                self.gist_file_temp_path,
-                self.content,
-                overwrite_ok=False,
-            )
+            difference = "content"
         return typing.cast(Difference, difference)
 
+    def _diff_binary(self, against: Path) -> Difference:
+        with against.open("rb") as file:
+            if compare.is_same(self.content.encode(), file):
+                return False
+        return "content"
 
-def write_file(file_path, content: str, *, overwrite_ok: bool) -> bool:
-    if overwrite_ok:
-        with open(file_path, mode="w") as file:
-            file.write(content)
-        return True
-    try:
-        with open(file_path, mode="x") as file:
-            file.write(content)
-        return True
-    except FileExistsError:
-        return False
+    def _diff_text(self, against: Path, against_lines: list[str]) -> Difference:
+        if compare.digest(against_lines) == self.digest:
+            return False
+        return equivalence.match(self.fingerprints, against_lines) or "content"
 
 
 @dataclass
@@ -139,33 +185,64 @@ class Gist:
 
     def __post_init__(self):
         self.filecount = int(self.filecount.partition(" ")[0])
+        # With the api and git backends, all file contents come with the file names
+        self._fetched_contents: Dict[str, GistFileContent] = {}
+        # So concurrent _get_file_content() calls fetch the gist's files once
+        self._fetch_lock = threading.Lock()
 
     def _get_file_names(self) -> List[str]:
         """Calls `gh gist view "{self.id}" --files` to get this gist's list of
         file names (e.g 'alpine.sh').
-        May use cache."""
+        With the api and git backends, gets the files' contents along with them.
+        Uses cache unless the gist was updated since; see `_reads_gist_cache()`."""
         if (
-            "r" in config.cache.mode
-            and (filenames := cache.get_gist_filenames(self.id)) is not None
+            _reads_gist_cache()
+            and (filenames := cache.get_gist_filenames(self.id, self.date)) is not None
         ):
             return filenames
-        filenames = system.run(f'gh gist view "{self.id}" --files').splitlines()
-        if "w" in config.cache.mode:
-            cache.set_gist_filenames(self.id, filenames)
+        if config.gist_backend in ("api", "git"):
+            self._fetched_contents = self._fetch_files()
+            filenames = list(self._fetched_contents)
+        else:
+            filenames = system.run(f'gh gist view "{self.id}" --files').splitlines()
+        cache.set_gist_filenames(self.id, filenames, updated_at=self.date)
         return filenames
 
-    def _get_file_content(self, file_name) -> str:
+    def _fetch_files(self) -> Dict[str, GistFileContent]:
+        """All file names and contents, either in one API request, or from the gist's
+        local git mirror after `git fetch`ing it (with blob shas)."""
+        if config.gist_backend == "git":
+            files = gist_mirror.get_gist_files(self.id)
+            return {name: GistFileContent(*file) for name, file in files.items()}
+        files = github_api.client().get_gist_files(self.id)
+        return {name: GistFileContent(content, None) for name, content in files.items()}
+
+    def _get_file_content(self, file_name) -> GistFileContent:
         """Calls `gh gist view '{self.id}' -f '{file_name}'` to get the file's content.
-        May use cache."""
+        With the git backend, the file's blob sha comes along.
+        Uses cache unless the gist was updated since; see `_reads_gist_cache()`."""
         if (
-            "r" in config.cache.mode
-            and (file_content := cache.get_gist_file_content(self.id, file_name))
+            _reads_gist_cache()
+            and (
+                file_content := cache.get_gist_file_content(
+                    self.id, file_name, self.date
+                )
+            )
             is not None
         ):
             return file_content
-        content = system.run(f"gh gist view '{self.id}' -f '{file_name}'")
-        if "w" in config.cache.mode:
-            cache.set_gist_file_content(self.id, file_name, content)
+        if config.gist_backend in ("api", "git"):
+            with self._fetch_lock:
+                if file_name not in self._fetched_contents:
+                    self._fetched_contents = self._fetch_files()
+                    filenames = list(self._fetched_contents)
+                    cache.set_gist_filenames(self.id, filenames, updated_at=self.date)
+            content = self._fetched_contents[file_name]
+        else:
+            content = GistFileContent(
+                system.run(f"gh gist view '{self.id}' -f '{file_name}'"), None
+            )
+        cache.set_gist_file_content(self.id, file_name, content, updated_at=self.date)
         return content
 
     def build_self_files(self, *, skip_ignored: bool) -> None:
@@ -174,7 +251,7 @@ class Gist:
 
         Calls self._get_file_names() (GET req) which may use cache.
 
-        Called by build_file_name_to_gist_files_parallel() in a threaded context."""
+        Called by GistPipeline in a threaded context."""
         filenames = self._get_file_names()
         for name in filenames:
             if tmrignore.is_ignored(name) and skip_ignored:
@@ -192,48 +269,177 @@ class Gist:
 
         Calls self._get_file_content(self, file_name) which may use cache.
 
-        Called by build_file_name_to_gist_files_parallel() in a threaded context.
+        Called in a threaded context.
         """
         for name, gist_file in self.files.items():
-            content = self._get_file_content(name)
-            gist_file.content = content
-            gist_file.rstripped_content = "\n".join(
-                filter(bool, map(str.rstrip, content.splitlines()))
-            )
+            gist_file.set_content(*self._get_file_content(name))
         logger.debug(f"Gist | [b]{self.short()}[/b] populated files content")
 
 
-def get_gist_list() -> List[str]:
+def _reads_gist_cache() -> bool:
     """
-    Calls `gh gist list -L 1000` to get the list of gists.
-    May use cache.
+    Cached gist file names and contents are stamped with the gist's updated date,
+    so they're safe to use in any cache mode but 'w' (refetch everything).
+    The gist index is synced with the gists updated since the last sync, and
+    periodically listed in full.
+    They're always written.
     """
-
-    if "r" in config.cache.mode and (gist_list := cache.gist_list) is not None:
-        return gist_list
-    gist_list = system.run("gh gist list -L 1000").splitlines()  # not safe
-    if "w" in config.cache.mode:
-        cache.gist_list = gist_list
-    return gist_list
+    return config.cache.mode != "w"
+
+
+GH_GIST_LIST_JQ = (
+    '.[] | [.id, (.description // ""), "\\(.files | length) files", '
+    '(if .public then "public" else "secret" end), .updated_at] | @tsv'
+)
+"""Formats `gh api gists` output like `gh gist list`"""
+
+
+def _list_gists(since: Optional[str]) -> Iterator[str]:
+    """`gh gist list` lines of all gists, or only of those updated at or after `since`.
+    Paginated, so there's no limit on the number of gists."""
+    if config.gist_backend == "api":
+        gists = github_api.client().list_gists(since=since)
+        yield from map(github_api.gist_list_line, gists)
+        return
+    query = f"gists?per_page={github_api.PER_PAGE}"
+    if since:
+        query += f"&since={since}"
+    yield from system.run(
+        f"gh api --paginate '{query}' --jq '{GH_GIST_LIST_JQ}'"
+    ).splitlines()
+
+
+def _is_fully_synced(gist_index: GistIndex) -> bool:
+    """Whether the gist index had a full listing in the last FULL_SYNC_MAX_AGE_SECONDS.
+    Indexes written before full listings were timestamped never had one."""
+    fully_synced_at = gist_index.fully_synced_at
+    return (
+        fully_synced_at is not None
+        and time.time() - fully_synced_at < FULL_SYNC_MAX_AGE_SECONDS
+    )
 
 
-def build_file_name_to_gist_files_parallel() -> Dict[str, List[GistFile]]:
+def iter_gist_list() -> Iterator[str]:
     """
-    Maps (using threads) the names of the GistFiles to their actual GistFiles.
+    Yields a `gh gist list` line per gist, most recently updated first.
+    Only gists updated since the last sync are listed (as they arrive, page by page with
+    the api backend); the rest come from the cached gist index, which is then updated.
+    A 'since' listing can't show deleted gists, so every FULL_SYNC_MAX_AGE_SECONDS all
+    gists are listed again, and those missing from the listing are dropped from the
+    index (and their cached files aren't used anymore). 'w' cache mode always lists
+    everything.
     """
-    logger.info("\nGist | Getting list of gists...")
-    filename_to_gist_files: Dict[str, List[GistFile]] = defaultdict(list)
-    gists: List[Gist] = []
-    gist_list: List[str] = get_gist_list()
-
-    # * files = gh gist view ... --files
-    logger.info("\nGist | Getting list of files for each gist...")
-    max_workers = (
-        min((gist_list_len := len(gist_list)), config.max_workers or gist_list_len) or 1
+    gist_index = cache.gist_index if _reads_gist_cache() else None
+    if gist_index and not _is_fully_synced(gist_index):
+        config.verbose >= 2 and logger.debug("Gist | Gist index is due for a full sync")
+        gist_index = None
+    since = gist_index.synced_at if gist_index else None
+    config.verbose >= 2 and logger.debug(f"Gist | Listing gists updated since {since}")
+    listed_at = time.time()
+    updated: Dict[str, str] = {}
+    for line in _list_gists(since):
+        updated[line.partition("\t")[0]] = line
+        yield line
+    lines = dict(updated)
+    if gist_index:
+        for gist_id, line in gist_index.lines.items():
+            if gist_id not in updated:
+                lines[gist_id] = line
+                yield line
+    dates = [line.rpartition("\t")[2] for line in updated.values()]
+    cache.gist_index = GistIndex(
+        max([since or "", *dates]) or None,
+        lines,
+        gist_index.fully_synced_at if gist_index else listed_at,
     )
-    max_workers: int = min(max_workers, 32)
-    with fut.ThreadPoolExecutor(max_workers) as executor:
-        for gist_str in gist_list:
+
+
+def iter_local_files(path: Path, *, max_depth: int) -> Iterator[Path]:
+    """Files under `path` down to `max_depth`, skipping excluded paths."""
+    if tmrignore.is_ignored(path.absolute()):
+        config.verbose >= 2 and logger.warning(
+            f"Gist.iter_local_files() | [b]{path}[/b]: skipping; excluded"
+        )
+        return
+    if safe_is_file(path):
+        yield path
+        return
+    if max_depth == 0:
+        return
+    if safe_is_dir(path):
+        for subpath in safe_glob(path, "*"):
+            yield from iter_local_files(subpath, max_depth=max_depth - 1)
+
+
+class GistPipeline:
+    """
+    Lists gists, gets their file names, walks the local tree and diffs local files
+    against gist files of the same name, all at once:
+    each gist moves on to its file names as soon as it's listed, and local files are
+    matched against the gist files that have arrived so far (and vice versa), so
+    network and disk work overlap.
+
+    Contents are only fetched for gist files that have a local file of the same name,
+    which is usually a small fraction of them.
+    A (gist file, local file) pair is diffed as soon as the gist file's content is
+    loaded. Matches are decided under a lock, so each pair is diffed once.
+    """
+
+    def __init__(self, executor: fut.Executor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self.gist_files: Dict[str, List[GistFile]] = defaultdict(list)
+        self.local_files: Dict[str, List[Path]] = defaultdict(list)
+        self._loaded: Set[GistFile] = set()
+        self._content_requested: Set[Tuple[str, str]] = set()
+
+    def _submit(self, fn: Callable, *args) -> None:
+        """Children are submitted by their parent task before it finishes, so the
+        pending count only reaches 0 when everything is done."""
+        with self._lock:
+            self._pending += 1
+
+        def task():
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.warning(
+                    f"Gist | {fn.__name__}{args} had {e.__class__.__name__}: {e}"
+                )
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if not self._pending:
+                        self._idle.notify_all()
+
+        self._executor.submit(task)
+
+    def run(
+        self, parent_path: Path, *, max_depth: int
+    ) -> Tuple[Dict[str, List[GistFile]], Dict[Path, List[GistFile]]]:
+        """
+        Returns the gist files by name, and the local files that match more than one
+        gist file (which aren't diffed, for the user to disambiguate).
+        """
+        self._submit(self._walk, parent_path, max_depth)
+        logger.info("\nGist | Listing gists...")
+        try:
+            self._list_gists()
+        except (github_api.GitHubApiError, http.client.HTTPException, OSError) as e:
+            # Like a failed gist, a failed listing (e.g. no token, rate limit, timeout)
+            # doesn't abort the run; the gists listed so far are still diffed
+            logger.warning(
+                f"Gist | listing gists had {e.__class__.__name__}: {e}; skipping the rest"
+            )
+        with self._lock:
+            self._idle.wait_for(lambda: not self._pending)
+        blob_shas.save()
+        return self.gist_files, self._take_ambiguous()
+
+    def _list_gists(self) -> None:
+        for gist_str in iter_gist_list():
             gist = Gist(*gist_str.split("\t"))
 
             # There shouldn't be many false positives, because description includes
@@ -242,21 +448,76 @@ def build_file_name_to_gist_files_parallel() -> Dict[str, List[GistFile]]:
             if tmrignore.is_ignored(gist.id) or tmrignore.is_ignored(gist.description):
                 logger.warning(f"Gist | [b]{gist.short()}[/b]: skipping; excluded")
                 continue
-
-            future = executor.submit(gist.build_self_files, skip_ignored=True)
-            # if exc := future.exception():
-            # 	raise exc
-            gists.append(gist)
-
-    # * file.content = gh gist view ... -f <NAME>
-    logger.info("\nGist | Populating contents of all gist files...")
-    with fut.ThreadPoolExecutor(max_workers) as executor:
-        for gist in gists:
-            for name, gistfile in gist.files.items():
-                future = executor.submit(gist.popuplate_files_content)
-                # if exc := future.exception():
-                # 	raise exc
-                filename_to_gist_files[name].append(gistfile)
-            config.verbose >= 2 and logger.debug(gist)
-
-    return filename_to_gist_files
+            dashboard.queue("gists")
+            self._submit(self._build_files, gist)
+
+    def _walk(self, parent_path: Path, max_depth: int) -> None:
+        for path in iter_local_files(parent_path, max_depth=max_depth):
+            with self._lock:
+                self.local_files[path.name].append(path)
+                gist_files = list(self.gist_files.get(path.name, ()))
+                loaded = [gist_file in self._loaded for gist_file in gist_files]
+            for gist_file, is_loaded in zip(gist_files, loaded):
+                if is_loaded:
+                    self._submit(gist_file.diff, path)
+                else:
+                    self._request_content(gist_file)
+
+    def _build_files(self, gist: "Gist") -> None:
+        with dashboard.track("gists", gist.short()):
+            try:
+                gist.build_self_files(skip_ignored=True)
+            except Exception as e:
+                logger.warning(
+                    f"Gist | [b]{gist.short()}[/b]: skipping; getting files had {e.__class__.__name__}: {e}"
+                )
+                return
+        for name, gist_file in gist.files.items():
+            with self._lock:
+                self.gist_files[name].append(gist_file)
+                has_local_match = name in self.local_files
+            if has_local_match:
+                self._request_content(gist_file)
+        config.verbose >= 2 and logger.debug(gist)
+
+    def _request_content(self, gist_file: GistFile) -> None:
+        """Once per gist file."""
+        task = (gist_file.gist.id, gist_file.file_name)
+        with self._lock:
+            if task in self._content_requested:
+                return
+            self._content_requested.add(task)
+        dashboard.queue("gists")
+        self._submit(self._load_content, gist_file)
+
+    def _load_content(self, gist_file: GistFile) -> None:
+        gist, name = gist_file.gist, gist_file.file_name
+        with dashboard.track("gists", f"{gist.short()} {name}"):
+            try:
+                content = gist._get_file_content(name)
+            except Exception as e:
+                logger.warning(
+                    f"Gist | file [b]'{name}'[/b] of {gist.short()}: skipping; getting content had {e.__class__.__name__}: {e}"
+                )
+                with self._lock:
+                    self.gist_files[name].remove(gist_file)
+                return
+        gist_file.set_content(*content)
+        with self._lock:
+            self._loaded.add(gist_file)
+            paths = list(self.local_files.get(gist_file.file_name, ()))
+        for path in paths:
+            self._submit(gist_file.diff, path)
+
+    def _take_ambiguous(self) -> Dict[Path, List[GistFile]]:
+        """Local files whose name matches more than one gist file. Any diffs done before
+        the second gist file arrived are dropped."""
+        need_user_disambiguation: Dict[Path, List[GistFile]] = {}
+        for name, gist_files in self.gist_files.items():
+            if len(gist_files) < 2:
+                continue
+            for path in self.local_files.get(name, ()):
+                need_user_disambiguation[path] = gist_files
+                for gist_file in gist_files:
+                    gist_file.diffs.pop(path, None)
+        return need_user_disambiguation
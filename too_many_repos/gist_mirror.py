@@ -0,0 +1,100 @@
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from too_many_repos import system
+from too_many_repos.log import logger
+from too_many_repos.tmrconfig import config
+
+GIST_URL = "https://gist.github.com/{gist_id}.git"
+
+
+class MirrorError(Exception):
+    pass
+
+
+def mirror_path(gist_id: str) -> Path:
+    return config.cache.path / "gists" / f"{gist_id}.git"
+
+
+def sync(gist_id: str, url: str = "") -> Path:
+    """
+    Clones the gist as a bare mirror under `config.cache.path`, or if it's already
+    there, `git fetch`es it, which transfers nothing but refs when the gist is unchanged.
+    Returns the mirror's path.
+
+    :raises MirrorError: if git failed.
+    """
+    url = url or GIST_URL.format(gist_id=gist_id)
+    mirror = mirror_path(gist_id)
+    if (mirror / "HEAD").is_file():
+        config.verbose >= 2 and logger.debug(f"GistMirror | Fetching {gist_id[:8]}")
+        returncode, output = system.run_with_returncode(
+            "git fetch --prune --quiet", cwd=mirror
+        )
+    else:
+        config.verbose >= 2 and logger.debug(f"GistMirror | Cloning {gist_id[:8]}")
+        mirror.parent.mkdir(parents=True, exist_ok=True)
+        returncode, output = system.run_with_returncode(
+            f'git clone --mirror --quiet "{url}" "{mirror}"'
+        )
+    if returncode:
+        raise MirrorError(f"{gist_id}: {output}")
+    return mirror
+
+
+def list_blobs(mirror: Path) -> List[Tuple[str, str]]:
+    """(file name, blob sha) of each file in the gist's HEAD. Gists are flat."""
+    process = subprocess.run(
+        ["git", "ls-tree", "-z", "HEAD"],
+        cwd=mirror,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if process.returncode:
+        raise MirrorError(f"{mirror}: {process.stderr.decode().strip()}")
+    blobs = []
+    for entry in filter(None, process.stdout.split(b"\0")):
+        meta, _, name = entry.partition(b"\t")
+        _mode, object_type, sha = meta.split(b" ")
+        if object_type == b"blob":
+            blobs.append((name.decode(), sha.decode()))
+    return blobs
+
+
+def read_blobs(mirror: Path, shas: List[str]) -> Dict[str, bytes]:
+    """Contents of the given blobs, read from the local object store by a single
+    `git cat-file --batch` process."""
+    if not shas:
+        return {}
+    process = subprocess.run(
+        ["git", "cat-file", "--batch"],
+        cwd=mirror,
+        input="".join(f"{sha}\n" for sha in shas).encode(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if process.returncode:
+        raise MirrorError(f"{mirror}: {process.stderr.decode().strip()}")
+    output = process.stdout
+    contents = {}
+    offset = 0
+    for sha in shas:
+        header_end = output.index(b"\n", offset)
+        header = output[offset:header_end].split(b" ")
+        if header[-1] == b"missing":
+            raise MirrorError(f"{mirror}: {sha} is missing")
+        size = int(header[2])
+        contents[sha] = output[header_end + 1 : header_end + 1 + size]
+        offset = header_end + 1 + size + 1  # content is followed by a newline
+    return contents
+
+
+def get_gist_files(gist_id: str) -> Dict[str, Tuple[str, str]]:
+    """File names mapped to their contents and blob shas, synced and read from the
+    local mirror. The shas are git's, so they hold even for content that isn't valid
+    UTF-8 (which is decoded with replacement characters)."""
+    mirror = sync(gist_id)
+    blobs = list_blobs(mirror)
+    contents = read_blobs(mirror, [sha for _, sha in blobs])
+    return {name: (contents[sha].decode(errors="replace"), sha) for name, sha in blobs}
@@ -0,0 +1,175 @@
+import http.client
+import json
+import os
+import queue
+import re
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+from too_many_repos import system
+from too_many_repos.log import logger
+from too_many_repos.tmrconfig import config
+
+DEFAULT_API_URL = "https://api.github.com"
+PER_PAGE = 100
+TIMEOUT_SECONDS = 30
+NEXT_LINK = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+class GitHubApiError(Exception):
+    pass
+
+
+Origin = Tuple[str, str, Optional[int]]
+"""(scheme, host, port)"""
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections per origin, shared between threads.
+    A connection is taken for the duration of one request and then put back, so
+    requests reuse TLS sessions instead of handshaking each time.
+    """
+
+    def __init__(self):
+        self._idle: Dict[Origin, queue.LifoQueue] = {}
+
+    def _idle_of(self, origin: Origin) -> queue.LifoQueue:
+        # dict.setdefault is atomic
+        return self._idle.setdefault(origin, queue.LifoQueue())
+
+    def _connect(self, origin: Origin) -> http.client.HTTPConnection:
+        scheme, host, port = origin
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=TIMEOUT_SECONDS)
+        return http.client.HTTPConnection(host, port, timeout=TIMEOUT_SECONDS)
+
+    def request(
+        self, url: str, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """GET `url`. Returns status, headers and body.
+        Retries once on a fresh connection if a pooled one was closed by the server."""
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        idle = self._idle_of(origin)
+        for attempt in range(2):
+            try:
+                connection = idle.get_nowait()
+                is_reused = True
+            except queue.Empty:
+                connection = self._connect(origin)
+                is_reused = False
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                connection.close()
+                if is_reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                idle.put(connection)
+            return response.status, dict(response.getheaders()), body
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        for idle in self._idle.values():
+            while not idle.empty():
+                idle.get_nowait().close()
+
+
+class GitHubClient:
+    """Just enough of the GitHub REST API to list the authenticated user's gists and
+    get their files."""
+
+    def __init__(self, api_url: str = DEFAULT_API_URL, token: Optional[str] = None):
+        self.api_url = api_url.rstrip("/")
+        self.pool = ConnectionPool()
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "too-many-repos",
+            "Connection": "keep-alive",
+        }
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+
+    def get_json(self, url: str) -> Tuple[Any, Dict[str, str]]:
+        config.verbose >= 2 and logger.debug(f"GitHubClient | GET {url}")
+        status, headers, body = self.pool.request(url, self.headers)
+        if status != 200:
+            raise GitHubApiError(f"GET {url}: {status} {body[:200]!r}")
+        return json.loads(body), headers
+
+    def list_gists(self, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yields gists as their pages arrive, following the Link header.
+        With `since` (ISO 8601), only gists updated at or after it."""
+        url: Optional[str] = f"{self.api_url}/gists?per_page={PER_PAGE}"
+        if since:
+            url += f"&since={since}"
+        while url:
+            gists, headers = self.get_json(url)
+            yield from gists
+            link = headers.get("Link") or headers.get("link") or ""
+            url = match.group(1) if (match := NEXT_LINK.search(link)) else None
+
+    def get_gist_files(self, gist_id: str) -> Dict[str, str]:
+        """File names mapped to their contents, in one request (plus one per file
+        that's too large to be included, over 1MB)."""
+        gist, _ = self.get_json(f"{self.api_url}/gists/{gist_id}")
+        files = {}
+        for name, file in gist["files"].items():
+            content = file.get("content")
+            if file.get("truncated") or content is None:
+                status, _, body = self.pool.request(file["raw_url"], self.headers)
+                if status != 200:
+                    raise GitHubApiError(f"GET {file['raw_url']}: {status}")
+                content = body.decode(errors="replace")
+            files[name] = content
+        return files
+
+
+def gist_list_line(gist: Dict[str, Any]) -> str:
+    """A gist from the API, in the tab-separated format of `gh gist list`."""
+    return "\t".join(
+        [
+            gist["id"],
+            (gist.get("description") or "").replace("\t", " "),
+            f"{len(gist['files'])} files",
+            "public" if gist.get("public") else "secret",
+            gist["updated_at"],
+        ]
+    )
+
+
+def get_token() -> Optional[str]:
+    """$GH_TOKEN, $GITHUB_TOKEN, or the token `gh` is logged in with."""
+    if token := os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN"):
+        return token
+    try:
+        return system.run("gh auth token") or None
+    except FileNotFoundError:
+        return None
+
+
+_client: Optional[GitHubClient] = None
+
+
+def client() -> GitHubClient:
+    """The shared client, created on first use. $GITHUB_API_URL overrides the API url
+    (e.g. for GitHub Enterprise)."""
+    global _client
+    if _client is None:
+        token = get_token()
+        if not token:
+            raise GitHubApiError(
+                "No GitHub token: set $GH_TOKEN, or log in with `gh auth login`"
+            )
+        _client = GitHubClient(os.environ.get("GITHUB_API_URL", DEFAULT_API_URL), token)
+    return _client
@@ -0,0 +1,151 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+IgnorePattern = Tuple[re.Pattern, bool]
+"""(compiled pattern, dir_only)"""
+
+
+class UnsureIfIgnored(Exception):
+    """Raised when matching would need semantics this module doesn't implement
+    (negated patterns), so the caller should ask git instead."""
+
+
+def translate(pattern: str) -> str:
+    """Translates a gitignore glob to a regex matched against a '/'-separated path
+    relative to the .gitignore's directory."""
+    i = 0
+    regex = ""
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            class_end = pattern.find("]", i + 2)
+            if class_end == -1:
+                regex += re.escape(char)
+            else:
+                char_class = pattern[i + 1 : class_end]
+                if char_class.startswith("!"):
+                    char_class = "^" + char_class[1:]
+                regex += f"[{char_class}]"
+                i = class_end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+def parse_ignore_lines(lines: List[str]) -> List[IgnorePattern]:
+    """
+    :raises UnsureIfIgnored: if a line is a negated pattern.
+    """
+    patterns = []
+    for line in lines:
+        if not line.endswith("\\ "):
+            line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("!"):
+            raise UnsureIfIgnored(line)
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if "/" in line:
+            # Anchored to the .gitignore's directory
+            regex = translate(line.lstrip("/"))
+        else:
+            regex = f"(?:.*/)?{translate(line)}"
+        patterns.append((re.compile(f"{regex}\\Z", re.DOTALL), dir_only))
+    return patterns
+
+
+class IgnoreRules:
+    """
+    A conservative subset of git's ignore rules: per-directory .gitignore files,
+    .git/info/exclude and the global excludes file.
+    Directories are consulted lazily, as `is_ignored()` is asked about their entries.
+    """
+
+    def __init__(self, worktree: Path, gitdir: Path):
+        self.worktree = worktree
+        self._dir_patterns: Dict[str, Optional[List[IgnorePattern]]] = {}
+        self._root_patterns: List[IgnorePattern] = []
+        for exclude_file in (gitdir / "info/exclude", _global_excludes_file()):
+            self._root_patterns += self._load(exclude_file) or []
+
+    @staticmethod
+    def _load(ignore_file: Optional[Path]) -> Optional[List[IgnorePattern]]:
+        if ignore_file is None:
+            return None
+        try:
+            lines = ignore_file.read_text().splitlines()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return parse_ignore_lines(lines)
+
+    def _patterns_of(self, dir_path: str) -> List[IgnorePattern]:
+        if dir_path not in self._dir_patterns:
+            self._dir_patterns[dir_path] = self._load(
+                self.worktree / dir_path / ".gitignore"
+            )
+        return self._dir_patterns[dir_path] or []
+
+    def is_ignored(self, path: str, *, is_dir: bool) -> bool:
+        """
+        `path` is relative to the worktree, '/'-separated.
+        Checks the path itself and each of its parent directories.
+
+        :raises UnsureIfIgnored: if a relevant ignore file has negated patterns.
+        """
+        parts = path.split("/")
+        for depth in range(1, len(parts) + 1):
+            sub_path = "/".join(parts[:depth])
+            sub_is_dir = is_dir or depth < len(parts)
+            if self._matches(sub_path, is_dir=sub_is_dir):
+                return True
+        return False
+
+    def _matches(self, path: str, *, is_dir: bool) -> bool:
+        candidates = [("", path, self._root_patterns)]
+        dir_path = ""
+        for part in path.split("/")[:-1]:
+            candidates.append((dir_path, path[len(dir_path) :].lstrip("/"), None))
+            dir_path = f"{dir_path}/{part}".lstrip("/")
+        candidates.append((dir_path, path[len(dir_path) :].lstrip("/"), None))
+        for base, relative, patterns in candidates:
+            if patterns is None:
+                patterns = self._patterns_of(base)
+            for regex, dir_only in patterns:
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(relative):
+                    return True
+        return False
+
+
+def _global_excludes_file() -> Optional[Path]:
+    """core.excludesFile from ~/.gitconfig, or git's default location."""
+    try:
+        gitconfig = (Path.home() / ".gitconfig").read_text()
+    except (FileNotFoundError, NotADirectoryError):
+        gitconfig = ""
+    if match := re.search(
+        r"^\s*excludesfile\s*=\s*(.+?)\s*$", gitconfig, re.IGNORECASE | re.MULTILINE
+    ):
+        return Path(os.path.expanduser(match.group(1).strip('"')))
+    xdg_config_home = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+    return Path(xdg_config_home) / "git/ignore"
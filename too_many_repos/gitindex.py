@@ -0,0 +1,210 @@
+import os
+import stat
+import struct
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional
+
+IndexEntry = namedtuple(
+    "IndexEntry",
+    [
+        "ctime_s",
+        "ctime_ns",
+        "mtime_s",
+        "mtime_ns",
+        "dev",
+        "ino",
+        "mode",
+        "uid",
+        "gid",
+        "size",
+        "sha",
+        "flags",
+        "extended_flags",
+        "path",
+    ],
+)
+"""`mtime_ns` and `ctime_ns` are the nanosecond fractions of `mtime_s` and `ctime_s`,
+as git stores them."""
+
+GitIndex = namedtuple("GitIndex", ["version", "entries", "extensions", "mtime_ns"])
+"""`extensions` maps signatures (e.g. b'TREE') to their raw data.
+`mtime_ns` is of the index file itself, for detecting racily clean entries."""
+
+ENTRY_HEADER = struct.Struct(">10L20sH")
+FLAG_ASSUME_VALID = 0x8000
+FLAG_EXTENDED = 0x4000
+FLAG_STAGE_MASK = 0x3000
+FLAG_NAME_MASK = 0x0FFF
+EXTENDED_FLAG_SKIP_WORKTREE = 0x4000
+EXTENDED_FLAG_INTENT_TO_ADD = 0x2000
+GITLINK_MODE = 0o160000
+
+# Extensions that change the meaning of the entries list
+UNSUPPORTED_EXTENSIONS = {b"link", b"sdir"}
+
+
+class UnsupportedIndex(ValueError):
+    pass
+
+
+def read_index(index_path: Path) -> GitIndex:
+    """
+    Parses a `.git/index` file of version 2, 3 or 4.
+
+    :raises UnsupportedIndex: if the file isn't an index, is of another version,
+      or uses extensions that change the meaning of the entries (split index, sparse dirs).
+    """
+    with open(index_path, "rb") as file:
+        mtime_ns = os.fstat(file.fileno()).st_mtime_ns
+        data = file.read()
+    if len(data) < 12 + 20:
+        raise UnsupportedIndex(f"{index_path}: too short")
+    signature, version, entry_count = struct.unpack_from(">4sLL", data)
+    if signature != b"DIRC":
+        raise UnsupportedIndex(f"{index_path}: bad signature {signature!r}")
+    if version not in (2, 3, 4):
+        raise UnsupportedIndex(f"{index_path}: unsupported version {version}")
+
+    entries: List[IndexEntry] = []
+    offset = 12
+    previous_path = b""
+    for _ in range(entry_count):
+        entry_start = offset
+        *stat_data, sha, flags = ENTRY_HEADER.unpack_from(data, offset)
+        offset += ENTRY_HEADER.size
+        extended_flags = 0
+        if flags & FLAG_EXTENDED:
+            if version < 3:
+                raise UnsupportedIndex(f"{index_path}: extended flag in version 2")
+            (extended_flags,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+        if version == 4:
+            strip_len, offset = _read_varint(data, offset)
+            path_end = data.index(b"\0", offset)
+            path = (
+                previous_path[: len(previous_path) - strip_len] + data[offset:path_end]
+            )
+            offset = path_end + 1
+        else:
+            name_len = flags & FLAG_NAME_MASK
+            if name_len < FLAG_NAME_MASK:
+                path_end = offset + name_len
+            else:
+                path_end = data.index(b"\0", offset)
+            path = data[offset:path_end]
+            # Entries are NUL-padded to a multiple of 8 bytes
+            entry_len = path_end - entry_start
+            offset = entry_start + ((entry_len + 8) & ~7)
+        previous_path = path
+        entries.append(
+            IndexEntry(
+                *stat_data,
+                sha.hex(),
+                flags,
+                extended_flags,
+                os.fsdecode(path),
+            )
+        )
+
+    extensions: Dict[bytes, bytes] = {}
+    while offset + 8 <= len(data) - 20:
+        ext_signature, ext_size = struct.unpack_from(">4sL", data, offset)
+        offset += 8
+        if ext_signature in UNSUPPORTED_EXTENSIONS:
+            raise UnsupportedIndex(
+                f"{index_path}: unsupported extension {ext_signature!r}"
+            )
+        extensions[ext_signature] = data[offset : offset + ext_size]
+        offset += ext_size
+    return GitIndex(version, entries, extensions, mtime_ns)
+
+
+def _read_varint(data: bytes, offset: int):
+    """git's offset encoding (varint.c), used for v4 path prefix compression."""
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, offset
+
+
+def cached_root_tree(index: GitIndex) -> Optional[str]:
+    """The root tree sha from the TREE (cache tree) extension, or None if it's missing
+    or invalidated (i.e. the index has changed since it was last written as a tree)."""
+    tree = index.extensions.get(b"TREE")
+    if not tree:
+        return None
+    path_end = tree.index(b"\0")
+    if path_end != 0:
+        return None
+    line_end = tree.index(b"\n", path_end)
+    entry_count, _, _subtree_count = tree[path_end + 1 : line_end].partition(b" ")
+    if int(entry_count) < 0:
+        return None
+    return tree[line_end + 1 : line_end + 21].hex()
+
+
+def entry_matches_stat(
+    entry: IndexEntry, stat_result: os.stat_result, index_mtime_ns: int
+) -> bool:
+    """
+    The stat shortcut `git status` takes: if an entry's cached mtime, size, inode and
+    file type match the file on disk, its content is assumed unchanged.
+
+    Racily clean entries (modified in the same timestamp tick the index was written in)
+    never match, since a later modification in that tick wouldn't change the mtime.
+    """
+    # git truncates these to 32 bits
+    if (stat_result.st_size & 0xFFFFFFFF) != entry.size:
+        return False
+    if (stat_result.st_ino & 0xFFFFFFFF) != entry.ino:
+        return False
+    if stat.S_IFMT(stat_result.st_mode) != stat.S_IFMT(entry.mode):
+        return False
+    if stat.S_ISREG(entry.mode) and (stat_result.st_mode & 0o100) != (
+        entry.mode & 0o100
+    ):
+        return False
+    mtime_s, mtime_ns = divmod(stat_result.st_mtime_ns, 1_000_000_000)
+    if mtime_s != entry.mtime_s:
+        return False
+    # git may be built without sub-second precision, in which case it stores 0
+    if entry.mtime_ns and mtime_ns != entry.mtime_ns:
+        return False
+    entry_mtime = entry.mtime_s * 1_000_000_000 + entry.mtime_ns
+    if entry.mtime_ns:
+        is_racy = entry_mtime >= index_mtime_ns
+    else:
+        is_racy = entry.mtime_s >= index_mtime_ns // 1_000_000_000
+    return not is_racy
+
+
+def is_worktree_stat_clean(worktree: Path, index: GitIndex) -> bool:
+    """
+    True if every tracked file's stat data matches its index entry, meaning git would
+    consider the worktree unchanged relative to the index without reading any content.
+    False if any entry is racy, differs, or is in a state this check doesn't handle
+    (conflicts, intent-to-add, sparse checkout, submodules).
+    """
+    for entry in index.entries:
+        if entry.flags & FLAG_STAGE_MASK:
+            return False
+        if entry.extended_flags & (
+            EXTENDED_FLAG_SKIP_WORKTREE | EXTENDED_FLAG_INTENT_TO_ADD
+        ):
+            return False
+        if entry.mode == GITLINK_MODE:
+            return False
+        if entry.flags & FLAG_ASSUME_VALID:
+            continue
+        try:
+            stat_result = os.lstat(worktree / entry.path)
+        except OSError:
+            return False
+        if not entry_matches_stat(entry, stat_result, index.mtime_ns):
+            return False
+    return True
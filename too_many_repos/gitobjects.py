@@ -0,0 +1,130 @@
+import bisect
+import hashlib
+import struct
+import zlib
+from pathlib import Path
+from typing import Optional
+
+PACK_IDX_SIGNATURE = b"\377tOc"
+PACK_OBJECT_COMMIT = 1
+
+
+def blob_sha(data: bytes) -> str:
+    """The sha git gives a file with this content (`git hash-object`)."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def resolve_ref(gitdir: Path, ref: str) -> Optional[str]:
+    """The sha a ref (e.g. 'refs/heads/master') points to, from the loose ref file or
+    packed-refs. Follows symbolic refs. None if it doesn't exist."""
+    for _ in range(5):  # symref depth
+        try:
+            value = (gitdir / ref).read_text().strip()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return _resolve_packed_ref(gitdir, ref)
+        if not value.startswith("ref: "):
+            return value
+        ref = value[len("ref: ") :]
+    return None
+
+
+def _resolve_packed_ref(gitdir: Path, ref: str) -> Optional[str]:
+    try:
+        packed_refs = (gitdir / "packed-refs").read_text()
+    except FileNotFoundError:
+        return None
+    suffix = f" {ref}"
+    for line in packed_refs.splitlines():
+        if line.endswith(suffix) and not line.startswith(("#", "^")):
+            return line[: -len(suffix)]
+    return None
+
+
+def read_commit_tree(gitdir: Path, commit_sha: str) -> Optional[str]:
+    """
+    The tree sha of a commit, read straight from the object store: either a loose
+    object, or an undeltified object in a pack.
+    None if it can't be read this way (deltified, in an alternate object store, etc).
+    """
+    raw = _read_loose_object(gitdir, commit_sha)
+    if raw is not None:
+        header, _, body = raw.partition(b"\0")
+        if not header.startswith(b"commit "):
+            return None
+    else:
+        body = _read_packed_commit(gitdir, commit_sha)
+        if body is None:
+            return None
+    first_line = body.split(b"\n", 1)[0]
+    if not first_line.startswith(b"tree "):
+        return None
+    return first_line[len(b"tree ") :].decode()
+
+
+def _read_loose_object(gitdir: Path, sha: str) -> Optional[bytes]:
+    try:
+        compressed = (gitdir / "objects" / sha[:2] / sha[2:]).read_bytes()
+    except FileNotFoundError:
+        return None
+    return zlib.decompress(compressed)
+
+
+def _read_packed_commit(gitdir: Path, sha: str) -> Optional[bytes]:
+    binary_sha = bytes.fromhex(sha)
+    for idx_path in (gitdir / "objects/pack").glob("*.idx"):
+        offset = _find_in_pack_idx(idx_path, binary_sha)
+        if offset is None:
+            continue
+        with idx_path.with_suffix(".pack").open("rb") as pack:
+            pack.seek(offset)
+            byte = pack.read(1)[0]
+            object_type = (byte >> 4) & 0x7
+            while byte & 0x80:
+                byte = pack.read(1)[0]
+            if object_type != PACK_OBJECT_COMMIT:
+                return None
+            decompressor = zlib.decompressobj()
+            body = b""
+            while not decompressor.eof:
+                chunk = pack.read(4096)
+                if not chunk:
+                    return None
+                body += decompressor.decompress(chunk)
+            return body
+    return None
+
+
+def _find_in_pack_idx(idx_path: Path, binary_sha: bytes) -> Optional[int]:
+    """Offset of an object in the .pack file, from a version 2 .idx file."""
+    data = idx_path.read_bytes()
+    if data[:4] != PACK_IDX_SIGNATURE or struct.unpack_from(">L", data, 4)[0] != 2:
+        return None
+    fanout_offset = 8
+    first_byte = binary_sha[0]
+    start = (
+        struct.unpack_from(">L", data, fanout_offset + (first_byte - 1) * 4)[0]
+        if first_byte
+        else 0
+    )
+    end = struct.unpack_from(">L", data, fanout_offset + first_byte * 4)[0]
+    object_count = struct.unpack_from(">L", data, fanout_offset + 255 * 4)[0]
+    shas_offset = fanout_offset + 256 * 4
+
+    class _Shas:
+        def __getitem__(self, i):
+            return data[shas_offset + i * 20 : shas_offset + i * 20 + 20]
+
+        def __len__(self):
+            return object_count
+
+    position = bisect.bisect_left(_Shas(), binary_sha, start, end)
+    if position >= end or _Shas()[position] != binary_sha:
+        return None
+    offsets_offset = shas_offset + object_count * 20 + object_count * 4
+    (offset,) = struct.unpack_from(">L", data, offsets_offset + position * 4)
+    if offset & 0x80000000:
+        large_offsets_offset = offsets_offset + object_count * 4
+        (offset,) = struct.unpack_from(
+            ">Q", data, large_offsets_offset + (offset & 0x7FFFFFFF) * 8
+        )
+    return offset
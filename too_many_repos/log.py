@@ -1,4 +1,6 @@
 import logging
+import re
+import sys
 from datetime import datetime
 from typing import IO, Callable, Literal, Mapping, Optional, Union
 
@@ -87,24 +89,72 @@ class TmrConsole(Console):
         )
 
 
-console = TmrConsole()
-rhandler = RichHandler(
-    level=logging.DEBUG,
-    console=console,
-    markup=True,
-    show_level=False,
-    show_time=False,
-    show_path=False,
-    rich_tracebacks=True,
-    tracebacks_extra_lines=10,
-    tracebacks_show_locals=True,
-)
+def get_output_format_from_sys_argv() -> str:
+    """Peeks at --format without popping it (click parses it later), because the console
+    is created on import, before main() runs."""
+    for i, arg in enumerate(sys.argv):
+        if arg.startswith("--format="):
+            return arg.partition("=")[2]
+        if arg == "--format" and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return "auto"
+
+
+def resolve_output_format(output_format: str) -> str:
+    """'auto' is 'rich' if stdout is a terminal, 'plain' otherwise."""
+    if output_format == "auto":
+        return "rich" if sys.stdout.isatty() else "plain"
+    return output_format
+
+
+MARKUP_TAG = re.compile(r"\[(?:/|/?[a-z#][\w #,().=-]*)\]")
+
+
+class PlainHandler(logging.Handler):
+    """
+    Writes records as plain text, for pipes and cron logs: rich markup tags are removed
+    with a regex instead of being parsed, and nothing is highlighted.
+    Flushes each record, like logging.StreamHandler, so it comes out before the output
+    of git and shell processes started after it.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = MARKUP_TAG.sub("", str(record.msg))
+            if record.levelno == logging.DEBUG:
+                msg = "# " + "\n# ".join(msg.splitlines())
+            elif record.levelno == logging.WARNING:
+                msg = f"WARNING: {msg}"
+            sys.stdout.write(msg + "\n")
+            sys.stdout.flush()
+        except Exception:
+            self.handleError(record)
+
+
+output_format = resolve_output_format(get_output_format_from_sys_argv())
+
+# With --format ndjson, stdout is reserved for records
+console = TmrConsole(stderr=output_format == "ndjson")
+if output_format == "plain":
+    handler = PlainHandler(level=logging.DEBUG)
+else:
+    handler = RichHandler(
+        level=logging.DEBUG,
+        console=console,
+        markup=True,
+        show_level=False,
+        show_time=False,
+        show_path=False,
+        rich_tracebacks=True,
+        tracebacks_extra_lines=10,
+        tracebacks_show_locals=True,
+    )
 logger = logging.getLogger()
 
 # handler = logging.StreamHandler()
 # handler.setFormatter(logging.Formatter('%(asctime)s %(name) %(levelname) %(message)s'))
 # logger.addHandler(handler)
-logger.addHandler(rhandler)
+logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
 
 
@@ -132,4 +182,6 @@ def record_factory(
     )
 
 
-logging.setLogRecordFactory(record_factory)
+# PlainHandler doesn't need the markup
+if output_format != "plain":
+    logging.setLogRecordFactory(record_factory)
@@ -0,0 +1,136 @@
+import subprocess as sp
+import time
+from collections import namedtuple
+from concurrent import futures as fut
+from typing import Dict, List
+
+from too_many_repos import system
+from too_many_repos.cache import cache
+from too_many_repos.log import logger
+from too_many_repos.repo import Repo
+from too_many_repos.tmrconfig import config
+
+MaintenanceRecord = namedtuple(
+    "MaintenanceRecord", ["fetch_duration", "status_duration", "maintained_at"]
+)
+
+
+def has_commit_graph(repo: Repo) -> bool:
+    objects_info = repo.gitdir / "objects/info"
+    return (objects_info / "commit-graph").is_file() or (
+        objects_info / "commit-graphs/commit-graph-chain"
+    ).is_file()
+
+
+def lacks_multi_pack_index(repo: Repo) -> bool:
+    """A multi-pack-index is only written if there are packs to index."""
+    pack_dir = repo.gitdir / "objects/pack"
+    if (pack_dir / "multi-pack-index").is_file():
+        return False
+    return any(pack_dir.glob("*.pack"))
+
+
+def is_slow(repo: Repo) -> bool:
+    return any(
+        duration is not None and duration >= config.maintenance_threshold
+        for duration in (repo.fetch_duration, repo.status_duration)
+    )
+
+
+def needs_maintenance(repo: Repo) -> bool:
+    return is_slow(repo) and (
+        not has_commit_graph(repo) or lacks_multi_pack_index(repo)
+    )
+
+
+def maintain(repo: Repo) -> None:
+    """
+    Writes a commit-graph and a multi-pack-index, and records the durations they're
+    meant to improve, so the next run can report the speedup.
+
+    Called by start_maintenance() in a threaded context, so doesn't chdir.
+    """
+    logger.debug(f"Maintenance | [b]{repo.path}[/b]: writing commit-graph...")
+    system.run(
+        "git commit-graph write --reachable",
+        cwd=repo.path,
+        stdout=sp.DEVNULL,
+        stderr=sp.DEVNULL,
+    )
+    logger.debug(f"Maintenance | [b]{repo.path}[/b]: writing multi-pack-index...")
+    system.run(
+        "git multi-pack-index write",
+        cwd=repo.path,
+        stdout=sp.DEVNULL,
+        stderr=sp.DEVNULL,
+    )
+    cache.set_repo_maintenance(
+        repo.path,
+        MaintenanceRecord(repo.fetch_duration, repo.status_duration, time.time()),
+    )
+
+
+def start_maintenance(
+    repos: List[Repo], executor: fut.Executor
+) -> Dict[Repo, fut.Future]:
+    """
+    Submits maintain() of every repo whose fetch or status took longer than
+    `config.maintenance_threshold` seconds, and lacks a commit-graph or a multi-pack-index.
+    Both make computing ahead/behind in `git status` much cheaper.
+
+    Meant to run while the user is busy with prompts.
+    """
+    futures = {}
+    for repo in filter(needs_maintenance, repos):
+        logger.info(
+            f"Maintenance | [b]{repo.path}[/b] is slow "
+            f"(fetch: {_format_duration(repo.fetch_duration)}, "
+            f"status: {_format_duration(repo.status_duration)}); "
+            f"writing commit-graph and multi-pack-index in the background"
+        )
+        futures[repo] = executor.submit(maintain, repo)
+    return futures
+
+
+def wait_for_maintenance(futures: Dict[Repo, fut.Future]) -> None:
+    if not futures:
+        return
+    logger.info(f"Maintenance | Waiting for {len(futures)} repos to finish...")
+    for repo, future in futures.items():
+        if exc := future.exception():
+            logger.warning(
+                f"Maintenance | [b]{repo.path}[/b]: {exc.__class__.__name__}: {exc}"
+            )
+
+
+def report_speedups(repos: List[Repo]) -> None:
+    """Compares the durations recorded before a previous run's maintenance to this
+    run's, then forgets the record."""
+    for repo in repos:
+        record: MaintenanceRecord = cache.get_repo_maintenance(repo.path)
+        if record is None:
+            continue
+        speedups = []
+        for stage, before, after in (
+            ("fetch", record.fetch_duration, repo.fetch_duration),
+            ("status", record.status_duration, repo.status_duration),
+        ):
+            if before is None or after is None:
+                continue
+            speedups.append(
+                f"{stage} {_format_duration(before)} → {_format_duration(after)} "
+                f"({before / max(after, 0.001):.1f}x)"
+            )
+        if not speedups:
+            # Nothing comparable was measured this run (e.g. --no-fetch and cached
+            # status); keep the record for a run that does.
+            continue
+        logger.good(
+            f"Maintenance | [b]{repo.path}[/b] since commit-graph was written: "
+            + ", ".join(speedups)
+        )
+        cache.delete_repo_maintenance(repo.path)
+
+
+def _format_duration(duration) -> str:
+    return "--" if duration is None else f"{duration:.2f}s"
@@ -0,0 +1,89 @@
+import typing
+from typing import Callable, List, Literal, Optional
+
+from too_many_repos.log import logger
+from too_many_repos.repo import Repo, run_in_parallel
+from too_many_repos.tmrconfig import config
+
+Action = Literal["pull", "skip", "ask"]
+"""
+- 'pull': `git pull --ff-only`, concurrently with other repos. Falls back to 'ask' if it fails.
+- 'skip': do nothing, and don't show the repo in the interactive loop.
+- 'ask': show the repo in the interactive loop, as without --policy.
+"""
+
+ACTIONS = typing.get_args(Action)
+
+PolicyRule = Callable[[Repo], Optional[Action]]
+"""Gets a Repo whose status is populated. Returns None to defer to the next rule."""
+
+
+def pull_clean_fast_forwards(repo: Repo) -> Optional[Action]:
+    """Nothing modified, behind, and can be fast-forwarded."""
+    if (
+        not repo.has_local_modified_files
+        and repo.is_behind
+        and not repo.is_ahead
+        and not repo.has_diverged
+    ):
+        return "pull"
+    return None
+
+
+DEFAULT_RULES: List[PolicyRule] = [pull_clean_fast_forwards]
+
+
+def decide(repo: Repo) -> Action:
+    """The first non-None action returned by `config.policy_rules`
+    (or DEFAULT_RULES if unset), or 'ask'. A rule that raises or returns something
+    that isn't an Action makes it 'ask'."""
+    rules = DEFAULT_RULES if config.policy_rules is None else config.policy_rules
+    for rule in rules:
+        try:
+            action = rule(repo)
+        except Exception as e:
+            logger.warning(
+                f"Policy | [b]{repo.path}[/b]: rule {getattr(rule, '__name__', rule)} "
+                f"had {e.__class__.__name__}: {e}. Asking."
+            )
+            return "ask"
+        if action is None:
+            continue
+        if action not in ACTIONS:
+            logger.warning(
+                f"Policy | [b]{repo.path}[/b]: rule {getattr(rule, '__name__', rule)} "
+                f"returned {action!r}, which isn't one of {ACTIONS}. Asking."
+            )
+            return "ask"
+        return action
+    return "ask"
+
+
+def apply_policy(repos: List[Repo]) -> List[Repo]:
+    """
+    Decides what to do with each repo, and pulls all repos that should be pulled
+    in parallel.
+
+    Returns the repos that still need a human, in their original order.
+    """
+    actions = {repo: decide(repo) for repo in repos}
+    to_pull = [repo for repo, action in actions.items() if action == "pull"]
+
+    failed_pulls = set()
+    if to_pull:
+        logger.info(f"Policy | Pulling {len(to_pull)} repos in parallel...")
+    for repo, (returncode, output) in run_in_parallel(to_pull, Repo.pull).items():
+        if returncode == 0:
+            logger.good(f"Policy | [b]{repo.path}[/b]: pulled")
+            config.verbose >= 1 and output and logger.debug(output)
+        else:
+            logger.warning(
+                f"Policy | [b]{repo.path}[/b]: pull failed; asking\n{output}"
+            )
+            failed_pulls.add(repo)
+
+    return [
+        repo
+        for repo, action in actions.items()
+        if action == "ask" or repo in failed_pulls
+    ]
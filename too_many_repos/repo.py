@@ -1,17 +1,46 @@
+import hashlib
 import os
+import re
 import subprocess as sp
+import time
+import zlib
 from collections import namedtuple
+from concurrent import futures as fut
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Generator
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
 
-from too_many_repos import system
+from too_many_repos import gitignore, gitindex, gitobjects, system
+from too_many_repos.cache import cache
 from too_many_repos.log import logger
 from too_many_repos.system import run
 from too_many_repos.tmrconfig import config
 
 Remotes = namedtuple("Remotes", ["origin", "upstream", "tracking", "current_branch"])
 
+PromptData = namedtuple("PromptData", ["status", "incoming_log", "diffstat"])
+"""Output of git commands shown before prompting about a repo; may contain colors."""
+
+FetchResult = namedtuple("FetchResult", ["duration", "error"])
+
+Branch = namedtuple("Branch", ["name", "upstream", "ahead", "behind", "gone"])
+
+StatusFingerprint = namedtuple(
+    "StatusFingerprint", ["gitdir_stamps", "worktree_digest", "max_mtime_ns"]
+)
+"""`gitdir_stamps` are (mtime_ns, size) of the git files `git status` output depends on,
+`worktree_digest` covers the stat data of tracked files and their directories."""
+
+StatusCacheEntry = namedtuple(
+    "StatusCacheEntry", ["fingerprint", "tracked_paths", "status"]
+)
+
+BRANCHES_FORMAT = "%(refname:short)%00%(upstream:short)%00%(upstream:track,nobracket)"
+
+# A file modified within this window of the moment its stat data was recorded may be
+# modified again without its mtime changing (coarse fs timestamps), so it is not cached.
+RACY_WINDOW_NS = 2_000_000_000
+
 
 @contextmanager
 def visit_dir(path) -> Generator[None, Any, None]:
@@ -46,25 +75,331 @@ class Repo:
         self.path = path
         self.gitdir = self.path / ".git"
         self.status = None
+        self.branches: List[Branch] = []
+        self.fetch_duration: Optional[float] = None
+        """Seconds. Set by main, since fetching happens in a subprocess."""
+        self.fetch_error: Optional[str] = None
+        self.status_duration: Optional[float] = None
+        """Seconds. None if status came from cache."""
+        self.unfinished: Optional[str] = None
+        """'fetch' or 'status' if that stage didn't finish before the --deadline"""
         self.remotes = self.get_remotes()
 
     def __repr__(self) -> str:
         return f"Repo({self.path})"
 
-    def fetch(self) -> None:
-        with visit_dir(self.path):
-            config.verbose >= 2 and logger.debug(f"git fetch in {self.path}...")
-            system.run(
-                "git fetch --all --prune --jobs=10",
-                stdout=sp.DEVNULL,
+    @property
+    def has_local_modified_files(self) -> bool:
+        return not self.status.endswith("nothing to commit, working tree clean")
+
+    @property
+    def is_behind(self) -> bool:
+        return "behind" in self.status
+
+    @property
+    def is_ahead(self) -> bool:
+        return "ahead" in self.status
+
+    @property
+    def has_diverged(self) -> bool:
+        return "have diverged" in self.status
+
+    def ahead_behind(self) -> Tuple[int, int]:
+        """Commit counts relative to upstream, parsed from self.status."""
+        if match := re.search(r"have (\d+) and (\d+) different commits", self.status):
+            return int(match.group(1)), int(match.group(2))
+        if match := re.search(r"is ahead of .+ by (\d+) commit", self.status):
+            return int(match.group(1)), 0
+        if match := re.search(r"is behind .+ by (\d+) commit", self.status):
+            return 0, int(match.group(1))
+        return 0, 0
+
+    def dirty_counts(self) -> Dict[str, int]:
+        """Number of paths in each section of self.status."""
+        return parse_status_counts(self.status)
+
+    def fetch(self, *, timeout: Optional[float] = None) -> FetchResult:
+        """Returns how long the fetch took, and git's output if it failed.
+        Thread-safe (doesn't chdir).
+
+        :raises subprocess.TimeoutExpired: if `timeout` passed; git was killed."""
+        started_at = time.perf_counter()
+        config.verbose >= 2 and logger.debug(f"git fetch in {self.path}...")
+        returncode, output = system.run_with_returncode(
+            "git fetch --all --prune --jobs=10", cwd=self.path, timeout=timeout
+        )
+        return FetchResult(
+            time.perf_counter() - started_at, output if returncode else None
+        )
+
+    def popuplate_status(self, *, timeout: Optional[float] = None) -> None:
+        """Sets self.status to the output of `git status`.
+        May use cache; see `_get_cached_status()`.
+        Doesn't run git if the repo is definitely clean; see `_get_clean_status()`.
+
+        :raises subprocess.TimeoutExpired: if `timeout` passed; git was killed."""
+        if (
+            "r" in config.cache.mode
+            and (status := self._get_cached_status()) is not None
+        ):
+            config.verbose >= 2 and logger.debug(
+                f"{self.path}: git status unchanged since last run, using cache"
+            )
+            self.status = status
+            return
+        if (status := self._get_clean_status()) is not None:
+            config.verbose >= 2 and logger.debug(
+                f"{self.path}: definitely clean according to index, not running git status"
+            )
+            self.status = status
+            return
+        if "w" not in config.cache.mode:
+            self.status = self._run_status(timeout)
+            return
+        tracked_paths = self._get_tracked_paths()
+        recorded_at_ns = time.time_ns()
+        fingerprint_before = self.status_fingerprint(tracked_paths)
+        status = self._run_status(timeout)
+        fingerprint_after = self.status_fingerprint(tracked_paths)
+        self.status = status
+        if fingerprint_before != fingerprint_after:
+            config.verbose >= 2 and logger.debug(
+                f"{self.path}: changed while running git status, not caching"
+            )
+            return
+        if fingerprint_after.max_mtime_ns >= recorded_at_ns - RACY_WINDOW_NS:
+            config.verbose >= 2 and logger.debug(
+                f"{self.path}: recently modified (racy), not caching git status"
+            )
+            return
+        cache.set_repo_status(
+            self.path, StatusCacheEntry(fingerprint_after, tracked_paths, status)
+        )
+
+    def pull(self) -> Tuple[int, str]:
+        """`git pull --ff-only`. Doesn't chdir, so it's safe to call from threads.
+        Returns the returncode and the combined stdout and stderr."""
+        config.verbose >= 2 and logger.debug(f"git pull in {self.path}...")
+        return system.run_with_returncode("git pull --ff-only", cwd=self.path)
+
+    def push(self) -> Tuple[int, str]:
+        """`git push origin <current branch>`. Doesn't chdir, so it's safe to call from
+        threads. Returns the returncode and the combined stdout and stderr."""
+        config.verbose >= 2 and logger.debug(f"git push in {self.path}...")
+        return system.run_with_returncode(
+            f'git push origin "{self.remotes.current_branch}"', cwd=self.path
+        )
+
+    def get_prompt_data(self, *, color: bool) -> PromptData:
+        """
+        Captures what's shown before prompting about this repo: `git status`, and
+        depending on the status, the incoming commits and the diffstat of local changes.
+        Doesn't chdir, so it's safe to call from threads.
+        """
+        config.verbose >= 2 and logger.debug(f"{self.path}: preparing prompt data...")
+        color_value = "always" if color else "never"
+        status = system.run(
+            f"git -c color.status={color_value} status",
+            cwd=self.path,
+            stderr=sp.DEVNULL,
+        )
+        incoming_log = ""
+        if self.is_behind or self.has_diverged:
+            incoming_log = system.run(
+                f"git log --oneline --color={color_value} -n 20 @..@{{u}}",
+                cwd=self.path,
+                stderr=sp.DEVNULL,
+            )
+        diffstat = ""
+        if self.has_local_modified_files:
+            diffstat = system.run(
+                f"git diff --stat --color={color_value} HEAD",
+                cwd=self.path,
                 stderr=sp.DEVNULL,
             )
+        return PromptData(status, incoming_log, diffstat)
+
+    def populate_branches(self) -> None:
+        """Sets self.branches with ahead/behind of every local branch, using a single
+        `git for-each-ref` instead of a process per branch."""
+        config.verbose >= 2 and logger.debug(f"git for-each-ref in {self.path}...")
+        output = system.run(
+            f"git for-each-ref --format='{BRANCHES_FORMAT}' refs/heads",
+            cwd=self.path,
+            stderr=sp.DEVNULL,
+        )
+        self.branches = parse_branches(output)
+
+    def stale_branches(self) -> List[Branch]:
+        """Branches other than the current one that are behind their upstream, or whose
+        upstream is gone."""
+        return [
+            branch
+            for branch in self.branches
+            if branch.name != self.remotes.current_branch
+            and (branch.behind or branch.gone)
+        ]
 
-    def popuplate_status(self) -> None:
+    def _run_status(self, timeout: Optional[float] = None) -> str:
+        started_at = time.perf_counter()
         with visit_dir(self.path):
             config.verbose >= 2 and logger.debug(f"git status in {self.path}...")
-            status = system.run("git status")
-        self.status = status
+            status = system.run("git status", timeout=timeout)
+        self.status_duration = time.perf_counter() - started_at
+        return status
+
+    def _get_cached_status(self) -> Optional[str]:
+        """The cached `git status` output, if the repo's fingerprint hasn't changed since
+        it was cached. Entries are only ever written when they weren't racy, so a matching
+        fingerprint means the stat data didn't change in any way git would notice."""
+        entry: Optional[StatusCacheEntry] = cache.get_repo_status(self.path)
+        if entry is None:
+            return None
+        if self.status_fingerprint(entry.tracked_paths) != entry.fingerprint:
+            return None
+        return entry.status
+
+    def _get_clean_status(self) -> Optional[str]:
+        """
+        What `git status` would output if it can be determined without running git that
+        the repo is clean and up to date with its upstream, otherwise None:
+
+        - HEAD is on a branch that points to the same commit as its upstream;
+        - the index matches HEAD (its cached root tree is HEAD's tree);
+        - every tracked file's stat data matches the index (like git's own shortcut);
+        - there are no untracked files that aren't ignored.
+        """
+        head_ref = self._get_head_ref()
+        if head_ref is None or not head_ref.startswith("refs/heads/"):
+            return None
+        branch = head_ref[len("refs/heads/") :]
+        try:
+            head_sha = gitobjects.resolve_ref(self.gitdir, head_ref)
+            if head_sha is None or len(head_sha) != 40:  # sha256 repos unsupported
+                return None
+            if tracking := self.remotes.tracking:
+                upstream_sha = gitobjects.resolve_ref(
+                    self.gitdir, f"refs/remotes/{tracking}"
+                ) or gitobjects.resolve_ref(self.gitdir, f"refs/heads/{tracking}")
+                if upstream_sha != head_sha:
+                    return None
+            elif f'[branch "{branch}"]' in (self.gitdir / "config").read_text():
+                # Upstream is configured but gone
+                return None
+            index = gitindex.read_index(self.gitdir / "index")
+            root_tree = gitindex.cached_root_tree(index)
+            if root_tree is None or root_tree != gitobjects.read_commit_tree(
+                self.gitdir, head_sha
+            ):
+                return None
+            if not gitindex.is_worktree_stat_clean(self.path, index):
+                return None
+            if self._has_untracked_files(index):
+                return None
+        except (OSError, ValueError, zlib.error) as e:
+            config.verbose >= 2 and logger.debug(
+                f"{self.path}: can't tell if clean without git: {e.__class__.__name__}: {e}"
+            )
+            return None
+        status = f"On branch {branch}\n"
+        if tracking:
+            status += f"Your branch is up to date with '{tracking}'.\n\n"
+        return status + "nothing to commit, working tree clean"
+
+    def _has_untracked_files(self, index: gitindex.GitIndex) -> bool:
+        """
+        Lists every directory that has tracked files in it, looking for entries that are
+        neither tracked nor ignored.
+        Errs on the side of True (e.g. empty untracked dirs, which git doesn't show).
+        """
+        tracked_paths = {entry.path for entry in index.entries}
+        tracked_dirs = {""}
+        for tracked_path in tracked_paths:
+            while (tracked_path := os.path.dirname(tracked_path)) not in tracked_dirs:
+                tracked_dirs.add(tracked_path)
+        try:
+            ignore_rules = gitignore.IgnoreRules(self.path, self.gitdir)
+            for dir_path in tracked_dirs:
+                with os.scandir(self.path / dir_path) as it:
+                    for dir_entry in it:
+                        path = (
+                            f"{dir_path}/{dir_entry.name}"
+                            if dir_path
+                            else dir_entry.name
+                        )
+                        if (
+                            path in tracked_paths
+                            or path in tracked_dirs
+                            or path == ".git"
+                        ):
+                            continue
+                        if not ignore_rules.is_ignored(
+                            path, is_dir=dir_entry.is_dir(follow_symlinks=False)
+                        ):
+                            return True
+        except gitignore.UnsureIfIgnored:
+            return True
+        return False
+
+    def _get_tracked_paths(self) -> List[str]:
+        try:
+            index = gitindex.read_index(self.gitdir / "index")
+        except (OSError, gitindex.UnsupportedIndex):
+            pass
+        else:
+            return [entry.path for entry in index.entries]
+        output = system.run("git ls-files -z", cwd=self.path, stderr=sp.DEVNULL)
+        return [path for path in output.split("\0") if path]
+
+    def _get_head_ref(self) -> Optional[str]:
+        """e.g. 'refs/heads/master', or None if HEAD is detached."""
+        try:
+            head = (self.gitdir / "HEAD").read_text().strip()
+        except OSError:
+            return None
+        if head.startswith("ref: "):
+            return head[len("ref: ") :]
+        return None
+
+    def status_fingerprint(self, tracked_paths: List[str]) -> StatusFingerprint:
+        """
+        A cheap stamp of everything `git status` looks at: the index, HEAD, the current
+        branch ref and its upstream ref (loose or packed), config and excludes, and
+        the stat data of tracked files plus the mtimes of their directories
+        (which change when untracked files are created or removed).
+        """
+        gitdir_files = ["index", "HEAD", "packed-refs", "config", "info/exclude"]
+        if head_ref := self._get_head_ref():
+            gitdir_files.append(head_ref)
+        if self.remotes.tracking:
+            gitdir_files.append(f"refs/remotes/{self.remotes.tracking}")
+        gitdir_stamps: List[Tuple[str, Optional[Tuple[int, int]]]] = []
+        max_mtime_ns = 0
+        for name in gitdir_files:
+            stamp = _stat_stamp(self.gitdir / name)
+            if stamp is not None:
+                max_mtime_ns = max(max_mtime_ns, stamp[0])
+            gitdir_stamps.append((name, stamp))
+
+        digest = hashlib.blake2b(digest_size=16)
+        dirs = {""}
+        for tracked_path in tracked_paths:
+            dirs.add(os.path.dirname(tracked_path))
+            try:
+                stat = os.lstat(self.path / tracked_path)
+            except OSError:
+                digest.update(f"{tracked_path}\0-\0".encode())
+                continue
+            max_mtime_ns = max(max_mtime_ns, stat.st_mtime_ns)
+            digest.update(
+                f"{tracked_path}\0{stat.st_mtime_ns}:{stat.st_size}:{stat.st_ino}\0".encode()
+            )
+        for dir_path in sorted(dirs):
+            stamp = _stat_stamp(self.path / dir_path)
+            if stamp is not None:
+                max_mtime_ns = max(max_mtime_ns, stamp[0])
+            digest.update(f"{dir_path}/\0{stamp}\0".encode())
+        return StatusFingerprint(tuple(gitdir_stamps), digest.digest(), max_mtime_ns)
 
     def is_gitdir_too_big(self) -> bool:  # Slow (10ms~100ms)
         gitdir_size_limit_byte = config.gitdir_size_limit_mb * 1_000_000
@@ -74,18 +409,102 @@ class Repo:
         """origin, upstream, tracking"""
         config.verbose >= 2 and logger.debug(f"{self.path}: getting remotes...")
         origin = "/".join(
-            run("git remote get-url origin", stderr=sp.DEVNULL).split("/")[-2:]
+            run("git remote get-url origin", cwd=self.path, stderr=sp.DEVNULL).split(
+                "/"
+            )[-2:]
         )
         upstream = "/".join(
-            run("git remote get-url upstream", stderr=sp.DEVNULL).split("/")[-2:]
+            run("git remote get-url upstream", cwd=self.path, stderr=sp.DEVNULL).split(
+                "/"
+            )[-2:]
         )
         tracking = run(
-            "git rev-parse --abbrev-ref --symbolic-full-name @{u}", stderr=sp.DEVNULL
+            "git rev-parse --abbrev-ref --symbolic-full-name @{u}",
+            cwd=self.path,
+            stderr=sp.DEVNULL,
+        )
+        current_branch = run(
+            "git rev-parse --abbrev-ref HEAD", cwd=self.path, stderr=sp.DEVNULL
         )
-        current_branch = run("git rev-parse --abbrev-ref HEAD", stderr=sp.DEVNULL)
         return Remotes(origin, upstream, tracking, current_branch)
 
 
+def run_in_parallel(
+    repos: List[Repo], git_action: Callable[[Repo], Tuple[int, str]]
+) -> Dict[Repo, Tuple[Optional[int], str]]:
+    """
+    Calls e.g. Repo.pull on every repo in a thread pool bounded by `config.max_workers`,
+    so it takes as long as the slowest repo rather than the sum of all of them.
+
+    Returns each repo's returncode and output, in the original order.
+    A returncode of None means the call raised; the output is then the exception.
+    """
+    if not repos:
+        return {}
+    max_workers = min((repos_len := len(repos)), config.max_workers or repos_len, 32)
+    with fut.ThreadPoolExecutor(max_workers) as executor:
+        futures = {repo: executor.submit(git_action, repo) for repo in repos}
+    results = {}
+    for repo, future in futures.items():
+        try:
+            results[repo] = future.result()
+        except Exception as e:
+            results[repo] = None, f"{e.__class__.__name__}: {e}"
+    return results
+
+
+STATUS_SECTIONS = {
+    "Changes to be committed:": "staged",
+    "Changes not staged for commit:": "unstaged",
+    "Untracked files:": "untracked",
+    "Unmerged paths:": "conflicted",
+}
+
+
+def parse_status_counts(status: str) -> Dict[str, int]:
+    """Counts the tab-indented paths under each section of long-format `git status`."""
+    counts = dict.fromkeys(STATUS_SECTIONS.values(), 0)
+    section = None
+    for line in status.splitlines():
+        if line in STATUS_SECTIONS:
+            section = STATUS_SECTIONS[line]
+        elif section and line.startswith("\t"):
+            counts[section] += 1
+        elif not line:
+            section = None
+    return counts
+
+
+def parse_branches(for_each_ref_output: str) -> List[Branch]:
+    """Parses lines of `git for-each-ref --format=BRANCHES_FORMAT`, e.g.
+    'feature\\0origin/feature\\0ahead 1, behind 2'."""
+    branches = []
+    for line in for_each_ref_output.splitlines():
+        if not line:
+            continue
+        name, upstream, track = line.split("\0")
+        ahead = behind = 0
+        gone = track == "gone"
+        if not gone:
+            for part in filter(bool, track.split(", ")):
+                direction, _, count = part.partition(" ")
+                if direction == "ahead":
+                    ahead = int(count)
+                elif direction == "behind":
+                    behind = int(count)
+        branches.append(Branch(name, upstream, ahead, behind, gone))
+    return branches
+
+
+def _stat_stamp(path: os.PathLike) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size), or None if doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def _dir_is_bigger_than(path: os.PathLike, size_bytes: int) -> bool:
     total = 0
     with os.scandir(path) as it:
@@ -0,0 +1,47 @@
+import json
+import sys
+from typing import Any, Dict, List, Sequence
+
+from too_many_repos.repo import Repo
+
+
+def repo_record(repo: Repo) -> Dict[str, Any]:
+    """Everything known about a repo once its status is populated, JSON-serializable.
+    Status-derived fields are None if its status didn't finish before the deadline."""
+    errors = []
+    if repo.fetch_error:
+        errors.append({"stage": "fetch", "message": repo.fetch_error})
+    record = {
+        "path": str(repo.path),
+        "remotes": repo.remotes._asdict(),
+        "ahead": None,
+        "behind": None,
+        "diverged": None,
+        "dirty": None,
+        "stale_branches": [branch._asdict() for branch in repo.stale_branches()],
+        "fetch_duration": repo.fetch_duration,
+        "status_duration": repo.status_duration,
+        "errors": errors,
+        "unfinished": repo.unfinished,
+    }
+    if repo.status is not None:
+        record["ahead"], record["behind"] = repo.ahead_behind()
+        record["diverged"] = repo.has_diverged
+        record["dirty"] = repo.dirty_counts()
+    return record
+
+
+def emit_ndjson(repo: Repo) -> None:
+    """Writes the repo's record as a single line to stdout, and flushes, so consumers
+    get it while the scan is still running."""
+    sys.stdout.write(json.dumps(repo_record(repo)) + "\n")
+    sys.stdout.flush()
+
+
+def plain_table(header: Sequence[str], rows: List[Sequence[str]]) -> str:
+    """Left-aligned columns separated by two spaces. Cheap, unlike a rich Table."""
+    widths = [max(len(row[i]) for row in (header, *rows)) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in (header, *rows)
+    )
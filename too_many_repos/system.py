@@ -1,7 +1,9 @@
 import os
 import shlex
+import signal
 import subprocess
 import sys
+from typing import Optional, Tuple
 
 from too_many_repos.log import logger
 from too_many_repos.tmrconfig import config
@@ -28,6 +30,36 @@ def run(cmd: str, *args, **kwargs) -> str:
     return ""
 
 
+def run_with_returncode(
+    cmd: str, *, timeout: Optional[float] = None, **kwargs
+) -> Tuple[int, str]:
+    """
+    Like ``run()``, but with stderr merged into stdout, and returns the returncode too.
+
+    If ``timeout`` passes, the command and everything it spawned (e.g. git-remote-https)
+    are killed, and ``subprocess.TimeoutExpired`` is raised.
+
+    Returns:
+        Tuple[int, str]: returncode and decoded output (or empty string).
+    """
+    if config.verbose >= 2:
+        logger.debug(f"Running: [code]{cmd}[/]")
+    process = subprocess.Popen(
+        shlex.split(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=timeout is not None,
+        **kwargs,
+    )
+    try:
+        stdout, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+        raise
+    return process.returncode, stdout.strip().decode() if stdout else ""
+
+
 def popen(
     cmd: str,
     *,
@@ -49,24 +81,6 @@ def is_macos() -> bool:
     return sys.platform == "darwin"
 
 
-def diff_quiet(diff_args) -> bool:
-    """True if same."""
-    if is_macos():
-        process = popen(
-            f"diff --ignore-space-change --strip-trailing-cr -q --color=never {diff_args}",
-            # stdout=subprocess.DEVNULL,
-            # stderr=subprocess.DEVNULL,
-        )
-    else:
-        process = popen(
-            f"diff --ignore-trailing-space --quiet --ignore-all-space --strip-trailing-cr --suppress-blank-empty {diff_args}",
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-    stdout, stderr = process.communicate(timeout=20)
-    return process.returncode == 0
-
-
 def diff_interactive(diff_args) -> int:
     """Side-by-side, colors, os.system."""
     if is_macos():
@@ -4,12 +4,11 @@ import sys
 import typing
 from collections.abc import Callable
 from pathlib import Path
-from typing import Any, Literal, Optional, TypeVar, Union
+from typing import Any, List, Literal, Optional, TypeVar, Union
 
 from click import BadOptionUsage
 from rich.traceback import install as rich_traceback_install
 
-from too_many_repos import system
 from too_many_repos.log import logger
 from too_many_repos.singleton import Singleton
 from too_many_repos.util import exec_file
@@ -18,6 +17,7 @@ rich_traceback_install(extra_lines=5, show_locals=True, suppress=(".venv",))
 
 CacheMode = Optional[Literal["r", "w", "r+w", "w+r", "rw", "wr"]]
 Shell = Literal["zsh", "bash"]
+GistBackend = Literal["gh", "api", "git"]
 _O = TypeVar("_O")
 
 NoneType = type(None)
@@ -30,7 +30,7 @@ def get_system_shell() -> Shell:
         shell = os.environ["SHELL"]
     except KeyError:
         # If $SHELL is not set, try to determine the default shell
-        if system.is_macos():
+        if sys.platform == "darwin":
             # On macOS, the default shell is usually zsh
             return "zsh"
         else:
@@ -253,6 +253,11 @@ class CacheConfig:
     - 'r': disk cache is only read if it exists. Nothing new is written to disk.
     - 'w': cache is always written to disk, ignoring and overwriting any existing disk cache.
     - 'r+w': disk cache is read if it exists, and new values are written to disk.
+    The same goes for the run checkpoint: 'w' records it, 'r' lets --resume read it.
+    Gist file names and contents are the exception: they're stamped with the gist's
+    updated date, so they're read in any mode but 'w', and always written.
+    So is the gist list, which is synced with only the gists updated since, and so are
+    local files' blob shas, which are keyed by the files' stat.
     """
 
     mode: CacheMode
@@ -297,6 +302,18 @@ class TmrConfig(Singleton):
     gitdir_size_limit_mb: int
     difftool: str
     shell: Shell
+    lookahead: int
+    """How many upcoming repos' prompt data to prepare in the background while prompting"""
+    maintenance_threshold: Optional[float]
+    """Seconds. If set, repos whose fetch or status took longer get a commit-graph and a multi-pack-index"""
+    policy_rules: Optional[List[Callable]]
+    """Used with --policy. See policy.PolicyRule. If None, policy.DEFAULT_RULES"""
+    gist_rules: Optional[List[Any]]
+    """How a local file can differ from a gist file and not be just 'content'.
+    See equivalence.EquivalenceRule. If None, equivalence.DEFAULT_RULES"""
+    gist_backend: GistBackend
+    """'gh': a `gh` process per request. 'api': the GitHub REST API over keep-alive connections.
+    'git': `gh api gists`, then git mirrors of the gists under cache.path, updated with `git fetch`"""
 
     def __init__(self):
         super().__init__()
@@ -334,6 +351,22 @@ class TmrConfig(Singleton):
             self, "shell", type_=Optional[str], default=get_system_shell
         )
 
+        _try_set_opt_from_sys_args(self, "lookahead", type_=Optional[int], default=3)
+
+        _try_set_opt_from_sys_args(
+            self, "maintenance_threshold", type_=Optional[float], default=None
+        )
+
+        _try_set_opt_from_sys_args(
+            self, "gist_backend", type_=Optional[GistBackend], default="gh"
+        )
+
+        # Can only be set in tmrrc.py
+        if not hasattr(self, "policy_rules"):
+            self.policy_rules = None
+        if not hasattr(self, "gist_rules"):
+            self.gist_rules = None
+
     def __repr__(self):
         rv = "TmrConfig()"
         attributes = {
@@ -1,23 +1,33 @@
 #!/bin/python3.8
 import os
 import re
+import subprocess
 import sys
-from collections import defaultdict
 from concurrent import futures as fut
-from multiprocessing import Pool as ProcPool
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional, Set
 
 import click
 from rich import print
 from rich.prompt import Confirm, Prompt
+from rich.table import Table
 
 import too_many_repos.gist as gist
-from too_many_repos.log import logger
-from too_many_repos.repo import Repo, is_repo
+from too_many_repos import difftool_store, maintenance, policy, report
+from too_many_repos.checkpoint import Checkpoint
+from too_many_repos.dashboard import dashboard
+from too_many_repos.deadline import by_value, deadline
+from too_many_repos.log import MARKUP_TAG, logger, resolve_output_format
+from too_many_repos.repo import (
+    Branch,
+    PromptData,
+    Repo,
+    is_repo,
+    run_in_parallel,
+)
 from too_many_repos.tmrconfig import config
 from too_many_repos.tmrignore import tmrignore
-from too_many_repos.util import safe_glob, safe_is_dir, safe_is_file, unrequired_opt
+from too_many_repos.util import safe_glob, safe_is_file, unrequired_opt
 
 
 def ask_user_which_gist_file_belongs_to(
@@ -39,79 +49,113 @@ def ask_user_which_gist_file_belongs_to(
     return matching_gist
 
 
-def get_direct_subdirs(path: Path) -> List[Path]:
-    direct_subdirs = []
-    if tmrignore.is_ignored(path.absolute()):
-        if config.verbose >= 2:
-            logger.warning(
-                f"Main.get_direct_subdirs() | [b]{path}[/b]: skipping; excluded"
-            )
-        return direct_subdirs
-    for subdir in filter(Path.is_dir, path.glob("*")):
-        if tmrignore.is_ignored(subdir.absolute()):
-            if (
-                config.verbose >= 2
-            ):  # keep >=2 because prints for all subdirs of excluded
-                logger.warning(
-                    f"Main.get_direct_subdirs() | [b]{subdir}[/b]: skipping; excluded"
-                )
+def format_branches(branches: List[Branch]) -> str:
+    """e.g. 'feature ([b]behind[/b] 3), old ([b]upstream gone[/b])'"""
+    formatted = []
+    for branch in branches:
+        if branch.gone:
+            formatted.append(f"{branch.name} ([b]upstream gone[/b])")
             continue
-        direct_subdirs.append(subdir)
-    return direct_subdirs
+        track = f"[b]behind[/b] {branch.behind}"
+        if branch.ahead:
+            track += f", ahead {branch.ahead}"
+        formatted.append(f"{branch.name} ({track})")
+    return ", ".join(formatted)
 
 
-def diff_recursively_with_gists(
-    path: Path, file_name_to_gist_files: Dict[str, List[gist.GistFile]], *, max_depth
-) -> Dict[Path, List[gist.GistFile]]:
-    """
-    Goes over files in `path` and diffs them against any matching gist.
+def is_actionable(repo: Repo) -> bool:
+    """Something modified, or we're behind, or mine and upstream diverged"""
+    return repo.has_local_modified_files or repo.is_behind or repo.has_diverged
 
-    Called in a multithreaded context.
-    """
-    if "\n" in str(path):
-        breakpoint()  # Should be removed after a run or two (Dec 6 2024)
-    if tmrignore.is_ignored(path.absolute()):
-        config.verbose >= 2 and logger.warning(
-            f"Main.diff_recursively_with_gists() | [b]{path}[/b]: skipping; excluded"
-        )
-        return defaultdict(list)
 
-    need_user_disambiguation: Dict[Path, List[gist.GistFile]] = defaultdict(list)
+def bulk_push(repos: List[Repo], *, quiet: bool) -> Set[Repo]:
+    """
+    Shows every repo that is ahead of its upstream (and not behind it), asks once,
+    and pushes them all in parallel.
 
-    # File case
-    if safe_is_file(path):
-        file = path
-        config.verbose >= 3 and logger.debug(
-            f"Main.diff_recursively_with_gists() | Checking if there a matching gist to {file}..."
+    Returns the repos that were pushed successfully.
+    """
+    ahead = [
+        repo
+        for repo in repos
+        if repo.is_ahead
+        and not repo.is_behind
+        and not repo.has_diverged
+        and repo.remotes.current_branch not in ("", "HEAD")
+    ]
+    if not ahead:
+        return set()
+    table = Table(title="Ahead of upstream", highlight=True)
+    for column in ("Repo", "Branch", "Status", "Local modifications"):
+        table.add_column(column)
+    for repo in ahead:
+        table.add_row(
+            str(repo.path),
+            repo.remotes.current_branch,
+            repo.status.splitlines()[1],
+            "yes" if repo.has_local_modified_files else "",
         )
-        gist_files = file_name_to_gist_files.get(file.name)
-        if not gist_files:
-            return defaultdict(list)
-        if len(gist_files) > 1:
-            need_user_disambiguation[file].extend(gist_files)
-            return need_user_disambiguation
-        gist_file = gist_files[0]
-        gist_file.diff(file)
-        return defaultdict(list)
-
-    # Directory case
-    if max_depth == 0:
-        config.verbose >= 3 and logger.debug(
-            f"Main.diff_recursively_with_gists() | Reached {max_depth = } in {path}"
+    print(table)
+    if quiet:
+        logger.info(
+            f"[prompt]Would've prompted to push {len(ahead)} repos, but quiet=True"
         )
-        return defaultdict(list)
+        return set()
+    if not Confirm.ask(
+        f"[prompt]Push {len(ahead)} repos to [b]origin[/b] <current branch>?[/]",
+        default=False,
+    ):
+        return set()
+
+    logger.info(f"Main.main() | Pushing {len(ahead)} repos in parallel...")
+    pushed = set()
+    for repo, (returncode, output) in run_in_parallel(ahead, Repo.push).items():
+        if returncode == 0:
+            logger.good(
+                f"[b]{repo.path}[/b]: pushed origin {repo.remotes.current_branch}"
+            )
+            config.verbose >= 1 and output and logger.debug(output)
+            pushed.add(repo)
+        else:
+            logger.warning(f"[b]{repo.path}[/b]: push failed\n{output}")
+    return pushed
 
-    config.verbose >= 3 and logger.debug(
-        f"Main.diff_recursively_with_gists() | Looking for gists to diff inside {path}..."
-    )
 
-    if safe_is_dir(path):
-        for subpath in path.glob("*"):
-            update = diff_recursively_with_gists(
-                subpath, file_name_to_gist_files, max_depth=max_depth - 1
+class PromptDataPrefetcher:
+    """
+    Prepares the prompt data of the next `config.lookahead` repos in the background,
+    while the user is answering the prompt of the current one.
+    """
+
+    def __init__(self, repos: List[Repo], executor: fut.Executor):
+        self._repos = repos
+        self._positions = {repo: i for i, repo in enumerate(repos)}
+        self._executor = executor
+        self._futures: Dict[Repo, fut.Future] = {}
+        self._submitted_up_to = 0
+        self._color = sys.stdout.isatty()
+
+    def _submit_up_to(self, position: int) -> None:
+        while self._submitted_up_to < min(position, len(self._repos)):
+            repo = self._repos[self._submitted_up_to]
+            self._futures[repo] = self._executor.submit(
+                repo.get_prompt_data, color=self._color
+            )
+            self._submitted_up_to += 1
+
+    def get(self, repo: Repo) -> Optional[PromptData]:
+        """Blocks until the repo's prompt data is ready, and starts preparing the next
+        repos'. None if preparing it failed."""
+        position = self._positions[repo]
+        self._submit_up_to(position + 1 + config.lookahead)
+        future = self._futures.pop(repo)
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning(
+                f"Main.main() | [b]{repo.path}[/b]: preparing prompt data had {e.__class__.__name__}: {e}"
             )
-            need_user_disambiguation.update(update)
-    return need_user_disambiguation
+            return None
 
 
 def populate_repos_recursively(path: Path, repos: List[Repo], *, max_depth) -> None:
@@ -140,6 +184,7 @@ def populate_repos_recursively(path: Path, repos: List[Repo], *, max_depth) -> N
             )
         else:
             repos.append(repo)
+            dashboard.advance("discovery")
     if max_depth == 0:
         config.verbose >= 3 and logger.debug(
             f"Main.populate_repos_recursively() | Reached {max_depth = } in {path}"
@@ -201,6 +246,31 @@ def populate_repos_recursively(path: Path, repos: List[Repo], *, max_depth) -> N
     help="Don't do any work with git repositories",
 )
 @unrequired_opt("--no-fetch", is_flag=True, help="Don't fetch before working on a repo")
+@unrequired_opt(
+    "--policy",
+    "use_policy",
+    is_flag=True,
+    help="Let config.policy_rules decide what to do with each repo (by default, pull clean repos that can be fast-forwarded), pull concurrently, and only prompt for the rest",
+)
+@unrequired_opt(
+    "--format",
+    "output_format",
+    type=Literal["auto", "rich", "plain", "ndjson"],
+    help="auto: rich if stdout is a terminal, plain otherwise. plain: no colors or markup, and repos with nothing modified are summarized in one table. ndjson: print a JSON record per repo to stdout as soon as its status is known, without prompts. Logs go to stderr",
+)
+@unrequired_opt(
+    "--deadline",
+    "deadline_seconds",
+    type=float,
+    default=None,
+    metavar="SECONDS",
+    help="Stop scheduling fetches and statuses this many seconds after starting, and kill git processes still running a few seconds later. Recently worked-in repos are scheduled first; unfinished repos are reported",
+)
+@unrequired_opt(
+    "--resume",
+    is_flag=True,
+    help="Skip discovering and fetching repos that were already discovered or fetched in the last hour by an interrupted run. Needs --cache-mode with 'r'; runs with 'w' in --cache-mode record their progress",
+)
 @click.option("-h", "--help", is_flag=True, help="Show this message and exit.")
 @click.pass_context
 # @break_on_exc(ValueError)
@@ -212,6 +282,10 @@ def main(
     should_check_repos: bool = True,
     quiet: bool = False,
     no_fetch: bool = False,
+    use_policy: bool = False,
+    output_format: Literal["auto", "rich", "plain", "ndjson"] = "auto",
+    deadline_seconds: Optional[float] = None,
+    resume: bool = False,
     help: bool = False,
 ):
     """
@@ -242,61 +316,45 @@ def main(
             f"{parent_path = },\n"
             f"{should_check_gists = },\n"
             f"{should_check_repos = },\n"
+            f"{use_policy = },\n"
+            f"{output_format = },\n"
+            f"{deadline_seconds = },\n"
+            f"{resume = },\n"
             f"{quiet = }"
         )
     )
-    print("\n[b]Excluding:[/]")
-    print(tmrignore.table())
-    print("\n[b]Configuration:[/]")
-    print(config)
-    if not Confirm.ask("Continue?", default=False):
-        return
+    output_format = resolve_output_format(output_format)
+    is_ndjson = output_format == "ndjson"
+    is_plain = output_format == "plain"
+    if is_ndjson or is_plain:
+        dashboard.enabled = False
+    if is_ndjson:
+        if should_check_gists:
+            logger.warning(
+                "Main.main() | --gists is not supported with --format ndjson"
+            )
+            should_check_gists = False
+    else:
+        print("\n[b]Excluding:[/]")
+        print(tmrignore.table())
+        print("\n[b]Configuration:[/]")
+        print(config)
+        if not Confirm.ask("Continue?", default=False):
+            return
     # *** main loop
 
     # ** gists
     if should_check_gists:
-        # * get gists
-        file_name_to_gist_files = gist.build_file_name_to_gist_files_parallel()
-        logger.info(f"\nMain.main() | Built {len(file_name_to_gist_files)} gists\n")
-
-        # * populate gist.files
-        direct_subdirs = get_direct_subdirs(parent_path)
-        max_workers = (
-            min(
-                (direct_subdirs_len := len(direct_subdirs)),
-                config.max_workers or direct_subdirs_len,
-            )
-            or 1
-        )
-        max_workers: int = min(max_workers, 32)
+        # * list gists, get their files, and diff them with local files as they come
+        max_workers: int = min(config.max_workers or 32, 32)
         logger.info(
             f"\nMain.main() | Diffing gists recursively in {max_workers} threads..."
         )
-        need_user_disambiguation: Dict[Path, List[gist.GistFile]] = defaultdict(list)
-        futures: Dict[Path, fut.Future] = {}
-        with fut.ThreadPoolExecutor(max_workers) as xtr:
-            for subdir in direct_subdirs:
-                future = xtr.submit(
-                    diff_recursively_with_gists,
-                    subdir,
-                    file_name_to_gist_files,
-                    max_depth=config.max_depth,
-                )
-                futures[subdir] = future
-
-        for subdir, future in futures.items():
-            current_need_user = future.result()
-            current_need_user and logger.debug(
-                f"Got {len(current_need_user)} paths that need user to disambiguate from {subdir}"
-            )
-            need_user_disambiguation.update(current_need_user)
-        current_need_user = diff_recursively_with_gists(
-            parent_path, file_name_to_gist_files, max_depth=1
-        )
-        current_need_user and logger.debug(
-            f"Main.main() | Got {len(current_need_user)} paths that need user to disambiguate from {parent_path}"
-        )
-        need_user_disambiguation.update(current_need_user)
+        with dashboard.live(), fut.ThreadPoolExecutor(max_workers) as xtr:
+            file_name_to_gist_files, need_user_disambiguation = gist.GistPipeline(
+                xtr
+            ).run(parent_path, max_depth=config.max_depth + 1)
+        logger.info(f"\nMain.main() | Built {len(file_name_to_gist_files)} gists\n")
         logger.debug(
             f"Main.main() | In total, {len(need_user_disambiguation)} paths need user to disambiguate"
         )
@@ -309,21 +367,24 @@ def main(
                             f"[b]Diff '{path.absolute()}'[/b] and [b]{gistfile.gist.short()}[/b] are [b yellow]different in {difference}[/]"
                         )
                         if Confirm.ask("Show diff?"):
+                            gistfile_path = gistfile.difftool_path()
                             # Break down e.g `code --disable-extensions --diff` to `"code" --disable-extensions --diff`
                             difftool, *difftool_args = config.difftool.split()
                             if re.match(r"^(meld|code|pycharm)", config.difftool):
                                 os.system(
-                                    f'nohup "{difftool}" {" ".join(difftool_args)} "{path}" "{gistfile.gist_file_temp_path}" 1>/dev/null 2>&1 &'
+                                    f'nohup "{difftool}" {" ".join(difftool_args)} "{path}" "{gistfile_path}" 1>/dev/null 2>&1 &'
                                 )
                             else:
                                 os.system(
-                                    f'"{difftool}" {" ".join(difftool_args)} "{path}" "{gistfile.gist_file_temp_path}"'
+                                    f'"{difftool}" {" ".join(difftool_args)} "{path}" "{gistfile_path}"'
                                 )
                     else:
                         logger.info(
                             f"[b]Diff '{path.absolute()}'[/b] and [b]{gistfile.gist.short()}[/b] are [b green]identical[/]"
                         )
 
+        difftool_store.collect_garbage()
+
     # if need_user_disambiguation:
     # 	breakpoint()
 
@@ -331,44 +392,157 @@ def main(
     if not should_check_repos:
         return
 
+    deadline.set(deadline_seconds)
+    # Under a deadline, the most valuable repos are scheduled first
+    schedule = by_value if deadline_seconds is not None else list
+    # * checkpoint; recorded with 'w' in cache mode, resumed from with 'r'
+    checkpoint = Checkpoint(parent_path, config.max_depth)
+    if resume and "r" not in config.cache.mode:
+        logger.warning(
+            "Main.main() | --resume needs 'r' in --cache-mode; starting over"
+        )
+        resume = False
+    if resume:
+        checkpoint.load()
+    if "w" in config.cache.mode:
+        checkpoint.open(append=resume)
+
     repos: List[Repo] = []
-    # * populate repos list
-    populate_repos_recursively(parent_path, repos, max_depth=config.max_depth)
-    if not repos:
-        logger.warning("No repos found!")
+    completed = False
+    try:
+        with dashboard.live():
+            # * populate repos list
+            if resume and checkpoint.discovered is not None:
+                logger.info(
+                    f"Main.main() | Resuming with {len(checkpoint.discovered)} discovered repos"
+                )
+                repos = [Repo(path) for path in checkpoint.discovered if is_repo(path)]
+                dashboard.advance("discovery", len(repos))
+            else:
+                populate_repos_recursively(
+                    parent_path, repos, max_depth=config.max_depth
+                )
+                checkpoint.record_discovered([repo.path for repo in repos])
+            if not repos:
+                logger.warning("No repos found!")
+                completed = True
+                return
+
+            # * fetch
+            max_workers = min(
+                (repos_len := len(repos)), config.max_workers or repos_len
+            )
+            max_workers: int = min(max_workers, 32)
+            if not no_fetch:
+                to_fetch = []
+                for repo in repos:
+                    if resume and (fetch_result := checkpoint.fetched.get(repo.path)):
+                        repo.fetch_duration, repo.fetch_error = fetch_result
+                    else:
+                        to_fetch.append(repo)
+                if len(to_fetch) < len(repos):
+                    logger.info(
+                        f"Main.main() | Resuming; {len(repos) - len(to_fetch)} repos were already fetched"
+                    )
+                logger.info(
+                    f"Main.main() | Fetching {len(to_fetch)} repos in {max_workers} threads..."
+                )
+                dashboard.queue("fetch", len(to_fetch))
+
+                def fetch(repo: Repo) -> None:
+                    if deadline.expired():
+                        repo.unfinished = "fetch"
+                        return
+                    with dashboard.track("fetch", str(repo.path)):
+                        try:
+                            fetch_result = repo.fetch(timeout=deadline.timeout())
+                        except subprocess.TimeoutExpired:
+                            repo.unfinished = "fetch"
+                        else:
+                            repo.fetch_duration, repo.fetch_error = fetch_result
+                            checkpoint.record_fetched(repo.path, fetch_result)
+
+                with fut.ThreadPoolExecutor(max_workers) as executor:
+                    list(executor.map(fetch, schedule(to_fetch)))
+
+            # * status
+            # Statuses aren't checkpointed; on resume, all repos are statused again (with
+            # 'r' in cache mode, the status cache skips repos that haven't changed since)
+            logger.info(f"Main.main() | Git status {len(repos)} repos serially...")
+            dashboard.queue("status", len(repos))
+            for repo in schedule(repos):
+                if deadline.expired():
+                    repo.unfinished = "status"
+                else:
+                    with dashboard.track("status", str(repo.path)):
+                        try:
+                            repo.popuplate_status(timeout=deadline.timeout())
+                            repo.populate_branches()
+                        except subprocess.TimeoutExpired:
+                            repo.status = None
+                            repo.unfinished = "status"
+                if is_ndjson:
+                    report.emit_ndjson(repo)
+        completed = not any(repo.unfinished for repo in repos)
+    finally:
+        checkpoint.close(completed=completed)
+
+    if unfinished := [repo for repo in repos if repo.unfinished]:
+        logger.warning(
+            f"Main.main() | Deadline passed; {len(unfinished)} repos are unfinished:\n"
+            + "\n".join(f"{repo.path}: {repo.unfinished}" for repo in unfinished)
+        )
+        repos = [repo for repo in repos if repo.status is not None]
+    logger.info("Main.main() | Done fetching and git statusing")
+    if is_ndjson:
         return
 
-    # * fetch
-    max_workers = min((repos_len := len(repos)), config.max_workers or repos_len)
-    max_workers: int = min(max_workers, 32)
-    if not no_fetch:
-        logger.info(
-            f"Main.main() | Fetching {len(repos)} repos in {max_workers} processes..."
-        )
-        with ProcPool(max_workers) as pool:
-            pool.map(Repo.fetch, repos)
+    # * maintenance (opt-in); runs in the background during the prompts below
+    if config.maintenance_threshold is not None:
+        maintenance.report_speedups(repos)
+        maintenance_executor = fut.ThreadPoolExecutor(max_workers)
+        maintenance_futures = maintenance.start_maintenance(repos, maintenance_executor)
 
-    # * status
-    logger.info(f"Main.main() | Git status {len(repos)} repos serially...")
-    for repo in repos:
-        repo.popuplate_status()
+    # * policy (opt-in); leaves only the repos that need a human
+    if use_policy:
+        repos = policy.apply_policy(repos)
 
-    logger.info("Main.main() | Done fetching and git statusing")
+    # * bulk push of everything that's ahead; one confirmation
+    pushed = bulk_push(repos, quiet=quiet)
 
+    prompt_data_executor = fut.ThreadPoolExecutor(max(config.lookahead, 1))
+    prefetcher = PromptDataPrefetcher(
+        list(filter(is_actionable, repos)), prompt_data_executor
+    )
+    nothing_modified_rows: List[List[str]] = []
     for repo in repos:
-        has_local_modified_files = not repo.status.endswith(
-            "nothing to commit, working tree clean"
-        )
+        has_local_modified_files = repo.has_local_modified_files
         remotes = repo.remotes
-        if (
-            not has_local_modified_files
-            and "behind" not in repo.status
-            and "have diverged" not in repo.status
-        ):
+        if not is_actionable(repo) and is_plain:
+            # * Non-actionable; summarized in one table after the loop
+            if repo in pushed:
+                state = f"pushed origin {remotes.current_branch}"
+            elif "ahead" in repo.status:
+                state = repo.status.splitlines()[1]
+            else:
+                state = "up-to-date"
+            nothing_modified_rows.append(
+                [
+                    str(repo.path),
+                    state,
+                    remotes.origin,
+                    remotes.tracking,
+                    MARKUP_TAG.sub("", format_branches(repo.stale_branches())),
+                ]
+            )
+            continue
+        if not is_actionable(repo):
             # * Non-actionable; print current state and continue to next repo (no prompts)
             # nothing modified,
             msg = f"[b]{repo.path}[/b]: nothing modified, "
-            if "ahead" in repo.status:
+            if repo in pushed:
+                msg += f"pushed origin {remotes.current_branch}."
+            elif "ahead" in repo.status:
                 # nothing modified, but upstream is behind.
                 msg += f"but {repo.status.splitlines()[1]}\n\t".replace(
                     "ahead", "[b]ahead[/b]"
@@ -384,6 +558,8 @@ def main(
                 msg += f" [b]upstream[/b]: [i]{remotes.upstream}[/i]."
             if remotes.tracking:
                 msg += f" [b]tracking[/b]: [i]{remotes.tracking}[/i]"
+            if stale_branches := repo.stale_branches():
+                msg += f"\n\t[b]stale branches[/b]: {format_branches(stale_branches)}"
 
             logger.good(msg)
             continue
@@ -391,7 +567,20 @@ def main(
         # * Interact whether to pull etc; either something modified, or we're behind/ahead, or mine and upstream diverged
         os.chdir(repo.path)
         logger.info(f"\n[prompt]{repo.path}[/]")
-        os.system("git status")  # Just to display in terminal
+        if prompt_data := prefetcher.get(repo):
+            # Not through rich, to keep git's colors and brackets as-is
+            sys.stdout.write(prompt_data.status + "\n")
+            if prompt_data.incoming_log:
+                logger.info("\n[b]Incoming commits:[/b]")
+                sys.stdout.write(prompt_data.incoming_log + "\n")
+            if prompt_data.diffstat:
+                logger.info("\n[b]Local changes:[/b]")
+                sys.stdout.write(prompt_data.diffstat + "\n")
+            sys.stdout.flush()
+        else:
+            os.system("git status")  # Just to display in terminal
+        if stale_branches := repo.stale_branches():
+            logger.info(f"[b]Stale branches[/b]: {format_branches(stale_branches)}")
         print()
 
         if has_local_modified_files:
@@ -403,7 +592,7 @@ def main(
                     os.system(f"{config.shell} -l")
                 continue
 
-            if "ahead" in repo.status:
+            if "ahead" in repo.status and repo not in pushed:
                 prompt = (
                     f"[b]{repo.path}[/b]: \[p]ush origin {remotes.current_branch}, "
                     f"launch a temporary [b]{config.shell}[/b] \[c]onsole, "
@@ -450,6 +639,16 @@ def main(
         # * end of main loop: go back to parent directory
         os.chdir(parent_path)
 
+    if nothing_modified_rows:
+        header = ["Nothing modified", "State", "Origin", "Tracking", "Stale branches"]
+        sys.stdout.write(
+            "\n" + report.plain_table(header, nothing_modified_rows) + "\n"
+        )
+    prompt_data_executor.shutdown(cancel_futures=True)
+    if config.maintenance_threshold is not None:
+        maintenance.wait_for_maintenance(maintenance_futures)
+        maintenance_executor.shutdown()
+
 
 def usage(ctx, parent_path: Path):
     helpstr = main.get_help(ctx)
@@ -477,6 +676,9 @@ def usage(ctx, parent_path: Path):
             "  --max-depth DEPTH: INT\t  [default: 1]",
             '  --difftool PATH: STR\t\t  [default: "diff"]',
             "  --gitdir-size-limit-mb SIZE_MB: INT\t A dir is skipped if its .git dir size >= SIZE_MB [default: 100]",
+            "  --lookahead COUNT: INT\t  Prepare the git status, incoming commits and diffstat of this many upcoming repos while prompting [default: 3]",
+            "  --maintenance-threshold SECONDS: FLOAT\t Write commit-graph and multi-pack-index for repos whose fetch or status took longer [default: None]",
+            '  --gist-backend BACKEND: STR\t  "gh": a `gh` process per request; "api": the GitHub REST API over keep-alive connections; "git": local git mirrors of the gists, updated with `git fetch` [default: "gh"]',
             "",
             h1(".tmrignore and .tmrrc.py files"),
             *"\n  ".join(
@@ -505,6 +707,10 @@ def usage(ctx, parent_path: Path):
                     "`config.gitdir_size_limit_mb`: int = 100",
                     "`config.cache.mode`: 'r' | 'w' | 'r+w' = None",
                     f"`config.cache.path`: str = '{Path.home()}/.cache/too-many-repos'",
+                    "`config.maintenance_threshold`: float = None",
+                    "`config.lookahead`: int = 3",
+                    "`config.policy_rules`: list[Callable[[Repo], 'pull' | 'skip' | 'ask' | None]] = None",
+                    "`config.gist_rules`: list[EquivalenceRule] = None",
                     "Note that cmdline opts have priority over settings in .tmrrc.py in case both are specified.",
                 ]
             ).splitlines(),